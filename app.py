@@ -1,6 +1,4 @@
 import streamlit as st
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
 from PIL import Image
 import numpy as np
 import pandas as pd
@@ -8,6 +6,8 @@ import os
 from datetime import datetime
 import matplotlib.pyplot as plt
 import csv
+from chess_inference import CLASS_LABELS, DecodedImage, InferenceEngine, default_model_path, load_classifier
+from prediction_log import LOG_COLUMNS, LOG_FILE, open_history_store
 
 # Настройка темы и цветов
 st.set_page_config(page_title="Chess Classifier Pro", page_icon="♟️", layout="centered")
@@ -55,40 +55,38 @@ print(plt.style.available)
 
 st.title("🧠♟️ Определение шахматной фигуры — Pro-версия")
 
-# Модель и классы
-model = load_model("final_model.h5")
-class_labels = {
-    'bishop': 'Слон 🐘',
-    'knight': 'Конь 🐴',
-    'pawn': 'Пешка 🧍‍♂️',
-    'queen': 'Ферзь 👑',
-    'rook': 'Ладья 🏰'
-}
-log_file = "predictions_log.csv"
-
-# Автоматическая инициализация лога, если файл отсутствует или повреждён
-if not os.path.exists(log_file):
-    with open(log_file, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(["Файл", "Класс", "Цвет", "Уверенность"])
-else:
-    # Проверяем корректность заголовков
-    try:
-        with open(log_file, 'r', encoding='utf-8-sig') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            if headers != ["Файл", "Класс", "Цвет", "Уверенность"]:
-                raise ValueError
-    except Exception:
-        with open(log_file, 'w', encoding='utf-8-sig', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Файл", "Класс", "Цвет", "Уверенность"])
+# Модель и классы (бэкенд выбирается переменной окружения CHESS_MODEL_BACKEND)
+model_path = default_model_path()
+
+@st.cache_resource(max_entries=1, show_spinner="Загрузка модели...")
+def get_engine(model_path, model_mtime):
+    """
+    Загружает и прогревает модель один раз на процесс.
+    model_mtime входит в ключ кэша: при замене файла модели она загрузится заново.
+    """
+    model = load_classifier(model_path)
+    return InferenceEngine(model, CLASS_LABELS).warmup()
+
+engine = get_engine(model_path, os.path.getmtime(model_path))
+class_labels = engine.class_labels
+log_file = LOG_FILE
+
+@st.cache_resource
+def get_history_store(log_file):
+    """
+    Одно хранилище истории на процесс: CSV-лог (заголовок проверяется при первом запуске,
+    дальше строки только дописываются) или SQLite, см. CHESS_HISTORY_BACKEND
+    """
+    return open_history_store(log_file=log_file)
+
+history_store = get_history_store(log_file)
 
 # 🎨 Определение цвета и вывод кропа
-def detect_color_preview(uploaded_file):
+def detect_color_preview(decoded_image):
     st.write("✅ detect_color_preview ВЫЗВАНА")
     try:
-        img = Image.open(uploaded_file).convert("L")
+        # Используем уже декодированное изображение, файл повторно не читается
+        img = decoded_image.convert("L")
         st.write("🖼️ Файл открыт через PIL, размер:", img.size)
         arr = np.array(img)
         h, w = arr.shape
@@ -110,54 +108,28 @@ def detect_color_preview(uploaded_file):
         return "Ошибка ❌", 0, None
 
 # 🧾 История с фильтрацией
-if os.path.exists(log_file):
-    try:
-        # Пробуем разные кодировки
-        encodings = ['utf-8-sig', 'utf-8', 'cp1251']
-        df_log = None
-        
-        for encoding in encodings:
-            try:
-                df_log = pd.read_csv(log_file, encoding=encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if df_log is None:
-            raise ValueError("Не удалось прочитать файл ни с одной кодировкой")
-            
-        # Проверяем наличие всех необходимых колонок
-        required_columns = ["Файл", "Класс", "Цвет", "Уверенность"]
-        missing_columns = [col for col in required_columns if col not in df_log.columns]
-        
-        if missing_columns:
-            # Если каких-то колонок нет, добавляем их
-            for col in missing_columns:
-                df_log[col] = "—"
-        
-        # Фильтры
-        st.subheader("📋 История предсказаний")
-        color_filter = st.selectbox("Фильтр по цвету", options=["Все", "Чёрная", "Белая"])
-        class_filter = st.selectbox("Фильтр по классу", options=["Все"] + list(class_labels.values()))
-        
-        # Применяем фильтры
-        if color_filter != "Все":
-            df_log = df_log[df_log["Цвет"].str.contains(color_filter, na=False)]
-        
-        if class_filter != "Все":
-            df_log = df_log[df_log["Класс"] == class_filter]
+try:
+    # Фильтры
+    st.subheader("📋 История предсказаний")
+    color_filter = st.selectbox("Фильтр по цвету", options=["Все", "Чёрная", "Белая"])
+    class_filter = st.selectbox("Фильтр по классу", options=["Все"] + list(class_labels.values()))
+    
+    # Фильтрация и выборка последних записей выполняются в хранилище
+    rows = history_store.query(
+        color=None if color_filter == "Все" else color_filter,
+        class_name=None if class_filter == "Все" else class_filter,
+        limit=5,
+        newest_first=True
+    )
+    
+    if rows:
+        df_log = pd.DataFrame(rows[::-1], columns=LOG_COLUMNS)
+        st.dataframe(df_log, use_container_width=True)
+    else:
+        st.info("История пуста")
         
-        if not df_log.empty:
-            st.dataframe(df_log.tail(5), use_container_width=True)
-        else:
-            st.info("История пуста")
-            
-    except Exception as e:
-        st.warning(f"⚠️ Проблема с чтением лога: {str(e)}")
-        # Создаем новый файл лога
-        with open(log_file, 'w', encoding='utf-8-sig', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Файл", "Класс", "Цвет", "Уверенность"])
+except Exception as e:
+    st.warning(f"⚠️ Проблема с чтением лога: {str(e)}")
 
 # 📤 Загрузка и предсказание для нескольких изображений
 uploaded_files = st.file_uploader("Загрузите изображения фигур", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
@@ -165,11 +137,23 @@ uploaded_files = st.file_uploader("Загрузите изображения ф
 if uploaded_files:
     predictions = []
     
+    # Декодируем каждый файл один раз (вход модели берётся из того же DecodedImage)
+    decoded_files = []
     for uploaded_file in uploaded_files:
-        st.image(uploaded_file, caption=f"🖼️ Загружено: {uploaded_file.name}", use_container_width=True)
+        try:
+            decoded_files.append((uploaded_file, DecodedImage(uploaded_file).load()))
+        except Exception as e:
+            st.error(f"❌ Не удалось открыть изображение {uploaded_file.name}: {e}")
+    
+    # Одно пакетное предсказание и векторизованный топ-3 для всех файлов
+    probabilities = engine.predict_batch([image for _, image in decoded_files])
+    top_indices, top_probs = engine.top_k(probabilities, k=3)
+    
+    for (uploaded_file, decoded_image), indices, probs in zip(decoded_files, top_indices, top_probs):
+        st.image(decoded_image.rgb, caption=f"🖼️ Загружено: {uploaded_file.name}", use_container_width=True)
 
         st.write("🧪 Пытаемся определить цвет через detect_color_preview")
-        fig_color, brightness, center_crop = detect_color_preview(uploaded_file)
+        fig_color, brightness, center_crop = detect_color_preview(decoded_image.rgb)
 
         if center_crop:
             st.image(center_crop, caption=f"🔍 Центр для анализа цвета (яркость: {brightness:.2f})", use_container_width=True)
@@ -177,33 +161,16 @@ if uploaded_files:
         color_emoji = "⚫️" if "Чёрная" in fig_color else "⚪️" if "Белая" in fig_color else "❔"
         st.markdown(f"### {color_emoji} Цвет фигуры: **{fig_color}**")
 
-        img = image.load_img(uploaded_file, target_size=(224, 224))
-        x = image.img_to_array(img)
-        x = np.expand_dims(x, axis=0) / 255.0
-
-        prediction = model.predict(x)[0]
-        idx = np.argmax(prediction)
-        confidence = float(np.max(prediction)) * 100
-        predicted_class = class_labels[list(class_labels.keys())[idx]]
+        predicted_class = engine.class_names[indices[0]]
+        confidence = float(probs[0]) * 100
 
         # Топ-3 вероятности
-        top3_idx = np.argsort(prediction)[::-1][:3]
-        top3_labels = [list(class_labels.values())[i] for i in top3_idx]
-        top3_probs = [prediction[i]*100 for i in top3_idx]
         st.info("Топ-3 вероятности:")
-        for label, prob in zip(top3_labels, top3_probs):
-            st.write(f"{label}: {prob:.2f}%")
+        for i, prob in zip(indices, probs):
+            st.write(f"{engine.class_names[i]}: {prob * 100:.2f}%")
 
         st.success(f"🟢 Модель определила: **{predicted_class}**, цвет: **{fig_color}**, уверенность: **{confidence:.2f}%**")
 
-        # 📊 График уверенности
-        st.subheader("📊 Уверенность по классам")
-        fig, ax = plt.subplots()
-        ax.bar(class_labels.values(), prediction * 100)
-        ax.set_ylabel('%')
-        ax.set_title('Уверенность модели')
-        st.pyplot(fig)
-
         # Добавляем результаты в список
         predictions.append({
             "Файл": uploaded_file.name,
@@ -212,25 +179,30 @@ if uploaded_files:
             "Уверенность": f"{confidence:.2f}%"
         })
 
+    # 📊 Общий график уверенности по всем файлам
+    if len(decoded_files) > 0:
+        st.subheader("📊 Уверенность по классам")
+        file_names = [uploaded_file.name for uploaded_file, _ in decoded_files]
+        fig, ax = plt.subplots(figsize=(8, max(3, 0.4 * len(file_names))))
+        left = np.zeros(len(file_names))
+        for j, label in enumerate(engine.class_names):
+            ax.barh(file_names, probabilities[:, j] * 100, left=left, label=label)
+            left += probabilities[:, j] * 100
+        ax.set_xlabel('%')
+        ax.set_xlim(0, 100)
+        ax.invert_yaxis()
+        ax.set_title('Уверенность модели')
+        ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.1), ncol=len(engine.class_names))
+        st.pyplot(fig)
+        plt.close(fig)
+
     # Показываем результаты всех изображений
     st.subheader("📋 Результаты сравнения изображений:")
     for pred in predictions:
         st.write(f"Файл: {pred['Файл']} — **{pred['Класс']}** (Цвет: {pred['Цвет']}), Уверенность: {pred['Уверенность']}")
 
-    # 💾 Сохраняем лог
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_df = pd.DataFrame(predictions)
-    
-    if os.path.exists(log_file):
-        try:
-            current = pd.read_csv(log_file, encoding='utf-8')
-            if set(current.columns) == set(log_df.columns):
-                log_df.to_csv(log_file, mode='a', index=False, header=False, encoding='utf-8-sig')
-            else:
-                log_df.to_csv(log_file, index=False, encoding='utf-8-sig')
-        except:
-            log_df.to_csv(log_file, index=False, encoding='utf-8-sig')
-    else:
-        log_df.to_csv(log_file, index=False, encoding='utf-8-sig')
+    # 💾 Сохраняем лог одной пачкой, без перечитывания файла
+    history_store.append_many(predictions)
+    history_store.flush()
 
 # Запуск вот такой # python -m streamlit run app.py
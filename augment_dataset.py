@@ -1,58 +1,63 @@
 import os
-import numpy as np
+import multiprocessing
 from PIL import Image
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import matplotlib.pyplot as plt
 from tqdm import tqdm
-from tensorflow.keras.utils import load_img, img_to_array
+from augmentation import AUGMENT_DATASET_PARAMS, AUGMENTATION_SEED
+from batch_augment import augment_files
+from materialize import describe, materialize_files
+from dataset_manifest import manifest_path, manifest_rows, write_manifest
+
+# Сколько изображений аугментируется одним стеком (единица работы для процессов)
+AUGMENT_CHUNK = 32
+# Число процессов аугментации; 1 — последовательно в текущем процессе
+AUGMENT_WORKERS = int(os.environ.get("CHESS_AUGMENT_WORKERS", os.cpu_count() or 1))
 
 def create_augmentation_generator():
     """
     Создает генератор для аугментации изображений с различными трансформациями
     """
-    return ImageDataGenerator(
-        rotation_range=30,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        shear_range=0.2,
-        zoom_range=0.2,
-        horizontal_flip=True,
-        vertical_flip=True,
-        fill_mode='nearest',
-        brightness_range=[0.8, 1.2],
-        channel_shift_range=50.0
-    )
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    return ImageDataGenerator(fill_mode='nearest', **AUGMENT_DATASET_PARAMS)
 
-def augment_class(input_dir, output_dir, class_name, target_count):
+def augment_chunk(task):
     """
-    Аугментирует изображения класса до целевого количества и всегда копирует оригиналы в целевую папку
+    Аугментирует один блок изображений класса (выполняется в процессе пула).
+    Сид каждой аугментации зависит от класса и имени файла (batch_augment.image_seed),
+    поэтому результат не зависит ни от разбиения на блоки, ни от числа процессов.
+    Возвращает число созданных файлов
+    """
+    class_path, output_path, class_name, chunk_idx, names, augmentations_per_image = task
+    items = [(os.path.join(class_path, img_name), output_path, class_name, augmentations_per_image)
+             for img_name in names]
+    outputs = augment_files(items, AUGMENT_DATASET_PARAMS)
+    return sum(len(paths) for paths in outputs if paths is not None)
+
+def prepare_class(input_dir, output_dir, class_name, target_count):
+    """
+    Копирует оригиналы класса и возвращает список блоков для аугментации
+    (пустой, если изображений достаточно или их нет)
     """
     class_path = os.path.join(input_dir, class_name)
     output_path = os.path.join(output_dir, class_name)
     os.makedirs(output_path, exist_ok=True)
     
     # Получаем список изображений
-    images = [f for f in os.listdir(class_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    images = sorted(f for f in os.listdir(class_path) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
     current_count = len(images)
     
     if current_count == 0:
         print(f"ВНИМАНИЕ: В классе {class_name} нет изображений! Пропускаем.")
-        return
+        return []
 
-    # Копируем оригинальные изображения ВСЕГДА
-    for img_name in images:
-        src_path = os.path.join(class_path, img_name)
-        dst_path = os.path.join(output_path, img_name)
-        if not os.path.exists(dst_path):
-            Image.open(src_path).save(dst_path)
+    # Оригиналы попадают в целевую папку ВСЕГДА — ссылками, без перекодирования
+    methods = materialize_files(
+        (os.path.join(class_path, img_name), os.path.join(output_path, img_name)) for img_name in images
+    )
 
     if current_count >= target_count:
-        print(f"Класс {class_name} уже имеет достаточно изображений ({current_count}) — копии созданы.")
-        return
-    
-    # Создаем генератор аугментации
-    datagen = create_augmentation_generator()
+        print(f"Класс {class_name} уже имеет достаточно изображений ({current_count}) — оригиналы добавлены ({describe(methods)}).")
+        return []
     
     # Аугментируем изображения
     needed_count = target_count - current_count
@@ -64,27 +69,64 @@ def augment_class(input_dir, output_dir, class_name, target_count):
     print(f"Нужно создать: {needed_count}")
     print(f"Аугментаций на изображение: {augmentations_per_image}")
     
-    for img_name in tqdm(images, desc=f"Аугментация {class_name}"):
-        img_path = os.path.join(class_path, img_name)
-        img = Image.open(img_path)
-        img_array = np.array(img)
-        img_array = img_array.reshape((1,) + img_array.shape)
-        
-        # Генерируем аугментированные изображения
-        aug_iter = datagen.flow(
-            img_array,
-            batch_size=1,
-            save_to_dir=output_path,
-            save_prefix=f'aug_{os.path.splitext(img_name)[0]}',
-            save_format='png'
-        )
-        
-        for _ in range(augmentations_per_image):
-            next(aug_iter)
+    return [
+        (class_path, output_path, class_name, chunk_idx, images[start:start + AUGMENT_CHUNK], augmentations_per_image)
+        for chunk_idx, start in enumerate(range(0, current_count, AUGMENT_CHUNK))
+    ]
+
+def run_augmentation(tasks, workers=AUGMENT_WORKERS, desc="Аугментация"):
+    """
+    Выполняет блоки последовательно или в пуле процессов с общим прогрессом
+    (в созданных файлах); результат не зависит от числа процессов
+    """
+    total = sum(len(task[4]) * task[5] for task in tasks)
+    with tqdm(total=total, desc=desc) as progress:
+        if workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                progress.update(augment_chunk(task))
+        else:
+            with multiprocessing.Pool(processes=min(workers, len(tasks))) as pool:
+                for created in pool.imap_unordered(augment_chunk, tasks):
+                    progress.update(created)
+    return total
+
+def count_images(path):
+    return len([f for f in os.listdir(path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
+
+def augment_class(input_dir, output_dir, class_name, target_count, workers=AUGMENT_WORKERS):
+    """
+    Аугментирует изображения класса до целевого количества и всегда копирует оригиналы в целевую папку
+    """
+    tasks = prepare_class(input_dir, output_dir, class_name, target_count)
+    if not tasks:
+        return
+    run_augmentation(tasks, workers, desc=f"Аугментация {class_name}")
+    
+    # Проверяем результат
+    print(f"Итоговое количество изображений: {count_images(os.path.join(output_dir, class_name))}")
+
+def augment_dataset(input_dir, output_dir, classes, target_count, workers=AUGMENT_WORKERS):
+    """
+    Аугментирует все классы сразу: блоки всех классов делятся между процессами пула
+    """
+    tasks = []
+    for class_name in classes:
+        tasks.extend(prepare_class(input_dir, output_dir, class_name, target_count))
+    
+    if tasks:
+        print(f"\nБлоков: {len(tasks)}, процессов: {max(1, min(workers, len(tasks)))}")
+        run_augmentation(tasks, workers)
     
     # Проверяем результат
-    final_count = len([f for f in os.listdir(output_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-    print(f"Итоговое количество изображений: {final_count}")
+    for class_name in classes:
+        print(f"{class_name}: {count_images(os.path.join(output_dir, class_name))} изображений")
+    
+    # Манифест: для аугментированных файлов — параметры и сид
+    params = {**AUGMENT_DATASET_PARAMS, "seed": AUGMENTATION_SEED}
+    write_manifest(
+        manifest_rows(output_dir, "train", augmentation=lambda name: params if name.startswith('aug_') else None),
+        manifest_path(os.path.basename(os.path.normpath(output_dir)))
+    )
 
 def visualize_augmentations(input_dir, output_dir, class_name):
     """
@@ -131,10 +173,10 @@ def main():
     target_count = 1000  # или больше, если нужно
 
     os.makedirs(output_dir, exist_ok=True)
-    classes = [d for d in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, d))]
+    classes = sorted(d for d in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, d)))
 
+    augment_dataset(input_dir, output_dir, classes, target_count)
     for class_name in classes:
-        augment_class(input_dir, output_dir, class_name, target_count)
         visualize_augmentations(input_dir, output_dir, class_name)
 
     print("\nАугментация завершена!")
@@ -0,0 +1,144 @@
+import math
+
+# Параметры в терминах ImageDataGenerator (как в augment_dataset.py)
+AUGMENT_DATASET_PARAMS = {
+    "rotation_range": 30,
+    "width_shift_range": 0.2,
+    "height_shift_range": 0.2,
+    "shear_range": 0.2,
+    "zoom_range": 0.2,
+    "horizontal_flip": True,
+    "vertical_flip": True,
+    "brightness_range": (0.8, 1.2),
+    "channel_shift_range": 50.0,
+}
+# Расширенная аугментация enhance_dataset.py
+ENHANCE_DATASET_PARAMS = {
+    "rotation_range": 30,
+    "width_shift_range": 0.2,
+    "height_shift_range": 0.2,
+    "shear_range": 0.2,
+    "zoom_range": 0.2,
+    "horizontal_flip": True,
+    "vertical_flip": True,
+    "brightness_range": (0.7, 1.3),
+    "channel_shift_range": 50.0,
+}
+# Аугментация при объединении наборов (download_and_merge_datasets.py)
+MERGE_AUGMENTATION_PARAMS = {
+    "rotation_range": 20,
+    "width_shift_range": 0.1,
+    "height_shift_range": 0.1,
+    "shear_range": 0.1,
+    "zoom_range": 0.1,
+    "horizontal_flip": True,
+    "brightness_range": (0.8, 1.2),
+}
+AUGMENTATION_SEED = 42
+
+class SeededAugmentation:
+    """
+    Аугментация пакета в памяти (TensorFlow): поворот, сдвиг, скос, масштаб, отражения,
+    яркость и сдвиг каналов — то же семейство преобразований, что и у ImageDataGenerator.
+    Все геометрические преобразования собираются в одну матрицу на изображение и
+    применяются одним вызовом ImageProjectiveTransformV3 для всего пакета.
+    Случайность stateless: результат определяется seed и номером пакета.
+    """
+
+    def __init__(self, seed=AUGMENTATION_SEED, rotation_range=0, width_shift_range=0.0,
+                 height_shift_range=0.0, shear_range=0.0, zoom_range=0.0, horizontal_flip=False,
+                 vertical_flip=False, brightness_range=None, channel_shift_range=0.0):
+        self.seed = seed
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.zoom_range = zoom_range
+        self.horizontal_flip = horizontal_flip
+        self.vertical_flip = vertical_flip
+        self.brightness_range = brightness_range
+        self.channel_shift_range = channel_shift_range
+
+    def seed_dataset(self):
+        """
+        Поток сидов для пакетов (tf.data), воспроизводимый при заданном seed
+        """
+        import tensorflow as tf
+        try:
+            return tf.data.Dataset.random(seed=self.seed, rerandomize_each_iteration=True)
+        except TypeError:
+            # Старые версии TensorFlow: одинаковая последовательность в каждой эпохе
+            return tf.data.Dataset.random(seed=self.seed)
+
+    def _matrices(self, batch_size, height, width, seeds):
+        import tensorflow as tf
+
+        def uniform(i, low, high):
+            return tf.random.stateless_uniform([batch_size], seeds[i], low, high)
+
+        def coin(i, enabled):
+            if not enabled:
+                return tf.ones([batch_size])
+            return tf.where(uniform(i, 0.0, 1.0) < 0.5, -1.0, 1.0)
+
+        zeros = tf.zeros([batch_size])
+        ones = tf.ones([batch_size])
+        theta = uniform(0, -self.rotation_range, self.rotation_range) * (math.pi / 180)
+        tx = uniform(1, -self.width_shift_range, self.width_shift_range) * width
+        ty = uniform(2, -self.height_shift_range, self.height_shift_range) * height
+        shear = uniform(3, -self.shear_range, self.shear_range) * (math.pi / 180)
+        zx = uniform(4, 1 - self.zoom_range, 1 + self.zoom_range)
+        zy = uniform(5, 1 - self.zoom_range, 1 + self.zoom_range)
+        fx = coin(6, self.horizontal_flip)
+        fy = coin(7, self.vertical_flip)
+
+        def matrix(rows):
+            return tf.stack([tf.stack(row, axis=-1) for row in rows], axis=-2)
+
+        # Матрицы переводят координаты выхода в координаты входа (x — столбец, y — строка),
+        # центр преобразований — центр изображения, как в apply_affine_transform
+        cx, cy = (width - 1) / 2, (height - 1) / 2
+        center = matrix([[ones, zeros, ones * cx], [zeros, ones, ones * cy], [zeros, zeros, ones]])
+        uncenter = matrix([[ones, zeros, -ones * cx], [zeros, ones, -ones * cy], [zeros, zeros, ones]])
+        flip = matrix([[fx, zeros, zeros], [zeros, fy, zeros], [zeros, zeros, ones]])
+        rotation = matrix([[tf.cos(theta), -tf.sin(theta), zeros],
+                           [tf.sin(theta), tf.cos(theta), zeros],
+                           [zeros, zeros, ones]])
+        shift = matrix([[ones, zeros, tx], [zeros, ones, ty], [zeros, zeros, ones]])
+        shear_m = matrix([[ones, -tf.sin(shear), zeros], [zeros, tf.cos(shear), zeros], [zeros, zeros, ones]])
+        zoom = matrix([[zx, zeros, zeros], [zeros, zy, zeros], [zeros, zeros, ones]])
+
+        full = center @ flip @ rotation @ shift @ shear_m @ zoom @ uncenter
+        return tf.reshape(full, [batch_size, 9])[:, :8]
+
+    def __call__(self, images, seed):
+        """
+        images: пакет (N, H, W, 3) в диапазоне 0..255; seed: скаляр из seed_dataset()
+        """
+        import tensorflow as tf
+
+        images = tf.cast(images, tf.float32)
+        shape = tf.shape(images)
+        batch_size, height, width = shape[0], shape[1], shape[2]
+        base = tf.stack([tf.cast(self.seed or 0, tf.int64), tf.cast(seed, tf.int64)])
+        seeds = tf.random.experimental.stateless_split(base, num=10)
+
+        transforms = self._matrices(batch_size, tf.cast(height, tf.float32), tf.cast(width, tf.float32), seeds)
+        images = tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=transforms,
+            output_shape=tf.stack([height, width]),
+            fill_value=0.0,
+            interpolation="BILINEAR",
+            fill_mode="NEAREST"
+        )
+
+        if self.brightness_range:
+            low, high = self.brightness_range
+            factor = tf.random.stateless_uniform([batch_size, 1, 1, 1], seeds[8], low, high)
+            images = images * factor
+        if self.channel_shift_range:
+            intensity = tf.random.stateless_uniform([batch_size, 1, 1, 1], seeds[9],
+                                                    -self.channel_shift_range, self.channel_shift_range)
+            images = images + intensity
+        return tf.clip_by_value(images, 0.0, 255.0)
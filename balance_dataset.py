@@ -1,30 +1,45 @@
 import os
-import shutil
-import random
+import sys
+from dataset_manifest import cap_per_class, manifest_path, manifest_rows, write_manifest
+from materialize import describe, materialize_files
 
-def balance_class(input_dir, output_dir, max_per_class=5000):
-    os.makedirs(output_dir, exist_ok=True)
-    for class_name in os.listdir(input_dir):
-        class_path = os.path.join(input_dir, class_name)
-        if not os.path.isdir(class_path):
-            continue
-        output_class_path = os.path.join(output_dir, class_name)
-        os.makedirs(output_class_path, exist_ok=True)
-        images = [f for f in os.listdir(class_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        random.shuffle(images)
-        selected = images[:max_per_class]
-        for img in selected:
-            src = os.path.join(class_path, img)
-            dst = os.path.join(output_class_path, img)
-            shutil.copy2(src, dst)
-        print(f"{class_name}: {len(selected)} изображений скопировано.")
+# Манифест сбалансированных наборов (сплиты train и val) — см. dataset_manifest.py
+BALANCED_MANIFEST = manifest_path('balanced')
+
+def balance_class(input_dir, output_dir, max_per_class=5000, split="train", seed=None, materialize=True):
+    """
+    Отбирает не более max_per_class изображений каждого класса. Возвращает строки
+    манифеста (пути к исходным файлам); при materialize отобранные файлы ещё и
+    раскладываются по output_dir ссылками (reflink/hardlink)
+    """
+    rows = cap_per_class(manifest_rows(input_dir, split), max_per_class, seed)
+    counts = {}
+    for row in rows:
+        counts[row["label"]] = counts.get(row["label"], 0) + 1
+
+    for class_name, count in counts.items():
+        if materialize:
+            output_class_path = os.path.join(output_dir, class_name)
+            os.makedirs(output_class_path, exist_ok=True)
+            methods = materialize_files(
+                (row["path"], os.path.join(output_class_path, os.path.basename(row["path"])))
+                for row in rows if row["label"] == class_name
+            )
+            print(f"{class_name}: {count} изображений ({describe(methods)}).")
+        else:
+            print(f"{class_name}: {count} изображений (только манифест).")
+    return rows
 
 def main():
-    random.seed(42)
+    # --manifest-only: только манифест, без каталогов balanced_*
+    materialize = '--manifest-only' not in sys.argv[1:]
     # Балансируем train
-    balance_class('data/augmented_train', 'data/balanced_train', max_per_class=5000)
+    train_rows = balance_class('data/augmented_train', 'data/balanced_train', max_per_class=5000,
+                               split="train", seed=42, materialize=materialize)
     # Балансируем val (если нужно)
-    balance_class('data/val', 'data/balanced_val', max_per_class=200)
+    val_rows = balance_class('data/val', 'data/balanced_val', max_per_class=200,
+                             split="val", seed=42, materialize=materialize)
+    write_manifest(train_rows + val_rows, BALANCED_MANIFEST)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
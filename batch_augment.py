@@ -0,0 +1,224 @@
+import os
+import sys
+import time
+import zlib
+import cv2
+import numpy as np
+from PIL import Image
+from augmentation import AUGMENT_DATASET_PARAMS, AUGMENTATION_SEED
+
+BENCHMARK_IMAGES = 256
+
+def warp_images(images, matrices):
+    """
+    Аффинное преобразование каждого изображения стека (cv2.warpAffine, билинейная
+    интерполяция); за краем берётся ближайший пиксель (fill_mode='nearest').
+    matrices (N, 3, 3) переводят координаты выхода в координаты входа.
+    Возвращает uint8 (N, H, W, C)
+    """
+    n, height, width = images.shape[:3]
+    out = np.empty_like(images)
+    for i in range(n):
+        # WARP_INVERSE_MAP: матрица уже задаёт отображение выход -> вход
+        cv2.warpAffine(images[i], matrices[i, :2], (width, height), dst=out[i],
+                       flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+    return out
+
+class BatchAugmenter:
+    """
+    Пакетная аугментация стека изображений: аффинные преобразования (поворот, сдвиг,
+    скос, масштаб, отражения) одной матрицей на изображение, сэмплинг cv2.warpAffine,
+    сдвиг каналов и яркость — векторно по всему стеку.
+    Параметры — как у ImageDataGenerator; результат определяется seed.
+    """
+
+    def __init__(self, seed=AUGMENTATION_SEED, rotation_range=0, width_shift_range=0.0,
+                 height_shift_range=0.0, shear_range=0.0, zoom_range=0.0, horizontal_flip=False,
+                 vertical_flip=False, brightness_range=None, channel_shift_range=0.0):
+        self.rng = np.random.default_rng(seed)
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.zoom_range = zoom_range
+        self.horizontal_flip = horizontal_flip
+        self.vertical_flip = vertical_flip
+        self.brightness_range = brightness_range
+        self.channel_shift_range = channel_shift_range
+
+    def _draw(self, rngs, n, draw):
+        # Общий генератор на весь стек или свой генератор у каждого изображения
+        if rngs is None:
+            return draw(self.rng, n)
+        return np.array([draw(rng, None) for rng in rngs], dtype=np.float64)
+
+    def random_matrices(self, n, height, width, rngs=None):
+        """
+        Матрицы (N, 3, 3), переводящие координаты выхода в координаты входа
+        (та же композиция, что и в augmentation.SeededAugmentation)
+        """
+        def uniform(low, high):
+            return self._draw(rngs, n, lambda rng, size: rng.uniform(low, high, size))
+
+        def coin(enabled):
+            if not enabled:
+                return np.ones(n)
+            return np.where(self._draw(rngs, n, lambda rng, size: rng.random(size)) < 0.5, -1.0, 1.0)
+
+        theta = np.deg2rad(uniform(-self.rotation_range, self.rotation_range))
+        tx = uniform(-self.width_shift_range, self.width_shift_range) * width
+        ty = uniform(-self.height_shift_range, self.height_shift_range) * height
+        shear = np.deg2rad(uniform(-self.shear_range, self.shear_range))
+        zx = uniform(1 - self.zoom_range, 1 + self.zoom_range)
+        zy = uniform(1 - self.zoom_range, 1 + self.zoom_range)
+        fx = coin(self.horizontal_flip)
+        fy = coin(self.vertical_flip)
+
+        cos, sin = np.cos(theta), np.sin(theta)
+        # flip @ rotation @ shift @ shear @ zoom, развёрнуто поэлементно
+        m = np.zeros((n, 3, 3))
+        m[:, 0, 0] = fx * cos * zx
+        m[:, 0, 1] = fx * (-cos * np.sin(shear) - sin * np.cos(shear)) * zy
+        m[:, 0, 2] = fx * (cos * tx - sin * ty)
+        m[:, 1, 0] = fy * sin * zx
+        m[:, 1, 1] = fy * (-sin * np.sin(shear) + cos * np.cos(shear)) * zy
+        m[:, 1, 2] = fy * (sin * tx + cos * ty)
+        m[:, 2, 2] = 1
+
+        # Центр преобразований — центр изображения
+        cx, cy = (width - 1) / 2, (height - 1) / 2
+        center = np.array([[1, 0, cx], [0, 1, cy], [0, 0, 1]])
+        uncenter = np.array([[1, 0, -cx], [0, 1, -cy], [0, 0, 1]])
+        return (center @ m @ uncenter).astype(np.float32)
+
+    def augment(self, images, seeds=None):
+        """
+        Аугментирует стек одинаковых по размеру изображений (N, H, W, C) uint8.
+        seeds — свой сид для каждого изображения: тогда результат изображения не зависит
+        от того, с какими изображениями оно попало в стек
+        """
+        images = np.asarray(images)
+        n, height, width = images.shape[:3]
+        if n == 0:
+            return images.copy()
+        rngs = None if seeds is None else [np.random.default_rng(seed) for seed in seeds]
+
+        matrices = self.random_matrices(n, height, width, rngs)
+        warped = warp_images(np.ascontiguousarray(images, dtype=np.uint8), matrices)
+        if not self.channel_shift_range and not self.brightness_range:
+            return warped
+
+        out = warped.astype(np.float32)
+        if self.channel_shift_range:
+            # Как apply_channel_shift: одна интенсивность на изображение, обрезка по его min/max
+            intensity = self._draw(rngs, n, lambda rng, size: rng.uniform(
+                -self.channel_shift_range, self.channel_shift_range, size))
+            low = images.min(axis=(1, 2, 3)).astype(np.float32)[:, None, None, None]
+            high = images.max(axis=(1, 2, 3)).astype(np.float32)[:, None, None, None]
+            out = np.clip(out + intensity[:, None, None, None].astype(np.float32), low, high)
+        if self.brightness_range:
+            low, high = self.brightness_range
+            factor = self._draw(rngs, n, lambda rng, size: rng.uniform(low, high, size))
+            out *= factor[:, None, None, None].astype(np.float32)
+        return np.clip(np.rint(out), 0, 255).astype(np.uint8)
+
+    def augment_many(self, images, seeds=None):
+        """
+        Аугментирует список изображений разного размера: одинаковые по форме
+        обрабатываются одним стеком, порядок результата совпадает со входом
+        """
+        result = [None] * len(images)
+        groups = {}
+        for i, image in enumerate(images):
+            groups.setdefault(np.shape(image), []).append(i)
+        for indices in groups.values():
+            group_seeds = None if seeds is None else [seeds[i] for i in indices]
+            augmented = self.augment(np.stack([images[i] for i in indices]), group_seeds)
+            for i, image in zip(indices, augmented):
+                result[i] = image
+        return result
+
+def class_seed(class_name, seed=AUGMENTATION_SEED):
+    """
+    Сид класса, не зависящий от порядка обработки классов
+    """
+    return (seed + zlib.crc32(class_name.encode('utf-8'))) % (2 ** 32)
+
+def image_seed(class_name, file_name, aug_idx, seed=AUGMENTATION_SEED):
+    """
+    Сид одной аугментации одного файла: не зависит ни от соседей по стеку,
+    ни от того, какие ещё файлы есть в классе
+    """
+    return (class_seed(class_name, seed), zlib.crc32(file_name.encode('utf-8')), aug_idx)
+
+def output_stem(path):
+    """
+    Основа имени производного файла с расширением исходного ('x.jpg' -> 'x_jpg'):
+    x.jpg и x.png из одного класса не перезаписывают результаты друг друга
+    """
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f'{stem}_{ext[1:].lower()}' if ext else stem
+
+def augment_files(items, params, seed=AUGMENTATION_SEED, prefix='aug_', extension='png'):
+    """
+    Аугментирует файлы стеками и сохраняет результаты как <prefix><имя>_<расширение>_<k>.<extension>.
+    items: [(путь, каталог результата, класс, число аугментаций)].
+    Возвращает для каждого файла список созданных путей; None — файл не читается
+    (ошибка печатается, остальные файлы обрабатываются)
+    """
+    augmenter = BatchAugmenter(seed=seed, **params)
+    arrays = []
+    for path, _, _, _ in items:
+        try:
+            with Image.open(path) as img:
+                arrays.append(np.asarray(img.convert('RGB')))
+        except (OSError, ValueError) as e:
+            print(f"Ошибка при обработке {path}: {str(e)}")
+            arrays.append(None)
+
+    outputs = [[] if array is not None else None for array in arrays]
+    for aug_idx in range(max((count for _, _, _, count in items), default=0)):
+        # Каждая аугментация обрабатывает все файлы, которым она нужна, одним стеком
+        indices = [i for i, item in enumerate(items) if item[3] > aug_idx and arrays[i] is not None]
+        seeds = [image_seed(items[i][2], os.path.basename(items[i][0]), aug_idx, seed) for i in indices]
+        for i, image in zip(indices, augmenter.augment_many([arrays[i] for i in indices], seeds)):
+            path, output_dir, _, _ = items[i]
+            output_path = os.path.join(output_dir, f'{prefix}{output_stem(path)}_{aug_idx}.{extension}')
+            Image.fromarray(image).save(output_path)
+            outputs[i].append(output_path)
+    return outputs
+
+def benchmark(images, params=AUGMENT_DATASET_PARAMS):
+    """
+    Изображений в секунду: пакетный движок против цикла ImageDataGenerator.flow(batch_size=1)
+    """
+    augmenter = BatchAugmenter(seed=AUGMENTATION_SEED, **params)
+    start = time.perf_counter()
+    augmenter.augment(images)
+    results = {"batch_augmenter": len(images) / (time.perf_counter() - start)}
+
+    try:
+        from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    except ImportError:
+        print("TensorFlow не установлен — сравнение с ImageDataGenerator пропущено")
+        return results
+
+    datagen = ImageDataGenerator(fill_mode='nearest', **params)
+    start = time.perf_counter()
+    for i in range(len(images)):
+        aug_iter = datagen.flow(images[i:i + 1], batch_size=1)
+        next(aug_iter)
+    results["image_data_generator"] = len(images) / (time.perf_counter() - start)
+    return results
+
+def main():
+    class_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join('data', 'balanced_train', 'bishop')
+    names = sorted(os.listdir(class_dir))[:BENCHMARK_IMAGES]
+    images = np.stack([np.asarray(Image.open(os.path.join(class_dir, name)).convert('RGB')) for name in names])
+
+    print(f"Аугментация {len(images)} изображений {images.shape[1]}x{images.shape[2]}:")
+    for name, speed in benchmark(images).items():
+        print(f"{name:<22}{speed:>10.1f} изобр./с")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import subprocess
+
+# Бюджет времени импорта модуля GUI (секунды), можно переопределить переменной окружения
+IMPORT_BUDGET = float(os.environ.get("CHESS_IMPORT_BUDGET", "1.5"))
+REPEATS = 3
+
+# Модули, которые не должны загружаться при импорте GUI (только по требованию)
+DEFERRED_MODULES = ["tensorflow", "pandas", "matplotlib", "reportlab", "cv2", "idlelib.tooltip"]
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(",".join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+def measure_import(module="chess_classifier_gui", repeats=REPEATS):
+    """
+    Импортирует модуль в чистом интерпретаторе repeats раз.
+    Возвращает (лучшее время в секундах, загруженные отложенные модули).
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    code = _PROBE.format(module=module, deferred=DEFERRED_MODULES)
+    timings = []
+    loaded = set()
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=base_dir, capture_output=True, text=True, check=True
+        )
+        seconds, modules = (result.stdout.strip().splitlines() + [""])[:2]
+        timings.append(float(seconds))
+        loaded.update(name for name in modules.split(",") if name)
+    return min(timings), sorted(loaded)
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else IMPORT_BUDGET
+    try:
+        seconds, loaded = measure_import()
+    except subprocess.CalledProcessError as e:
+        print(f"Ошибка импорта chess_classifier_gui:\n{e.stderr}")
+        sys.exit(2)
+
+    print(f"Импорт chess_classifier_gui: {seconds:.3f} с (бюджет {budget:.3f} с)")
+    failed = False
+    if seconds > budget:
+        print("❌ Превышен бюджет времени импорта")
+        failed = True
+    if loaded:
+        print(f"❌ При импорте загружены тяжёлые модули: {', '.join(loaded)}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Время импорта в пределах бюджета")
+
+if __name__ == "__main__":
+    main()
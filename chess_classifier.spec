@@ -6,22 +6,21 @@ a = Analysis(
     ['chess_classifier_gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('final_model.h5', '.'), ('Fon.jpg', '.')],
+    # Модель в ONNX: TensorFlow в сборку не входит (бэкенд по умолчанию — ONNX Runtime)
+    datas=[('final_model.onnx', '.'), ('Fon.jpg', '.')],
     hiddenimports=[
-        'tensorflow',
-        'tensorflow.keras',
+        'onnxruntime',
         'numpy',
         'PIL',
         'cv2',
         'customtkinter',
         'matplotlib',
-        'pandas',
-        'reportlab'
+        'pandas'
     ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['tensorflow', 'keras', 'tensorboard', 'tf2onnx'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
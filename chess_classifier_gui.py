@@ -1,3 +1,5 @@
+import time  # для анимаций и замеров запуска
+_IMPORT_START = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk
 import customtkinter as ctk
@@ -5,22 +7,25 @@ from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk
 import numpy as np
 import os
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-import pandas as pd
 from datetime import datetime
-import json
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from idlelib.tooltip import Hovertip
-import time  # для анимаций
-import cv2
 import threading # Для выполнения обработки в отдельном потоке
 import sys # Импортируем sys
+# Тяжёлые зависимости (matplotlib, OpenCV, pandas, idlelib) импортируются
+# в функциях, которым они нужны, чтобы окно появлялось быстрее
+from chess_inference import CLASS_LABELS, DecodedImage, InferenceEngine, load_engine_async
+from prediction_log import LOG_FILE, open_history_store
+from stats_aggregator import StatsAggregator
+from startup_timing import StartupTimer
+
+# Время импорта модуля (входит в отчёт о запуске)
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
+
+# Частота обновления прогресса пакетной обработки (мс)
+BATCH_PROGRESS_INTERVAL_MS = 100
+# Размер страницы истории, подгружаемой при прокрутке
+HISTORY_PAGE_SIZE = 200
+# Частота проверки готовности фоновой загрузки модели (мс)
+MODEL_POLL_INTERVAL_MS = 100
 
 class ChessClassifierApp:
     def __init__(self, root):
@@ -77,42 +82,28 @@ class ChessClassifierApp:
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         
-        # Загрузка модели (может занять время, делаем это перед показом главного окна)
-        try:
-            # Определяем базовый путь для ресурсов
-            if getattr(sys, 'frozen', False):
-                # Если запущен из PyInstaller
-                base_path = sys._MEIPASS
-            else:
-                # Если запущен как обычный скрипт
-                base_path = os.path.dirname(__file__)
-
-            model_path = os.path.join(base_path, "final_model.h5")
-            self.model = load_model(model_path) # Используем полный путь к модели
-            self.model_loaded = True
-        except Exception as e:
-            self.model = None
-            self.model_loaded = False
+        # Замеры холодного старта: импорты, окно, загрузка модели, первое предсказание
+        self.startup_timer = StartupTimer(start=_IMPORT_START)
+        self.startup_timer.record("imports", IMPORT_SECONDS)
         
         # Классы фигур
-        self.class_labels = {
-            'bishop': 'Слон 🐘',
-            'knight': 'Конь 🐴',
-            'pawn': 'Пешка 🧍‍♂️',
-            'queen': 'Ферзь 👑',
-            'rook': 'Ладья 🏰'
-        }
+        self.class_labels = CLASS_LABELS
         
-        self.log_file = "predictions_log.csv"
+        # Модель загружается в фоновом потоке, пока показан приветственный экран.
+        # До готовности движок не содержит модели; классификация ждёт model_future.
+        self.model = None
+        self.model_loaded = False
+        self.engine = InferenceEngine(None, self.class_labels)
+        self._model_lock = threading.Lock()
+        self.model_future = load_engine_async(class_labels=self.class_labels, timer=self.startup_timer)
         
-        # Инициализация статистики
-        self.stats = {
-            "total_classifications": 0,
-            "by_class": {},
-            "by_color": {"Белая ♙": 0, "Чёрная ♟️": 0}
-        }
+        self.log_file = LOG_FILE
+        # Хранилище истории: CSV-лог (только дописывание) или SQLite с индексами
+        self.history_store = open_history_store(log_file=self.log_file)
         
-        self.load_stats()
+        # Инициализация статистики (в памяти, на диск пишется с задержкой и при выходе)
+        self.stats_aggregator = StatsAggregator()
+        self.stats = self.stats_aggregator.stats
         
         # Создаем фрейм для приветственного экрана
         self.splash_frame = ctk.CTkFrame(self.root)
@@ -120,6 +111,48 @@ class ChessClassifierApp:
         
         # Создаем виджеты приветственного экрана
         self.create_splash_widgets()
+        self.startup_timer.record_since_start("window")
+        
+        # Следим за фоновой загрузкой модели из основного потока Tkinter
+        self.root.after(MODEL_POLL_INTERVAL_MS, self.poll_model_ready)
+
+    def wait_for_model(self):
+        """
+        Дожидается фоновой загрузки модели. Возвращает True, если модель готова.
+        Может вызываться и из рабочих потоков (пакетная обработка).
+        """
+        with self._model_lock:
+            if not self.model_loaded and self.model_future is not None:
+                try:
+                    self.engine = self.model_future.result()
+                    self.model = self.engine.model
+                    self.model_loaded = True
+                except Exception as e:
+                    print(f"Ошибка загрузки модели: {e}")
+                # Результат получен один раз, дальше используется self.engine
+                self.model_future = None
+            return self.model_loaded
+
+    def model_status(self):
+        # Текст и цвет статуса модели для главного окна
+        future = self.model_future
+        if future is not None and not future.done():
+            return "⏳ Модель загружается...", self.color_scheme["warning"]
+        if self.model_loaded or (future is not None and future.exception() is None):
+            return "✅ Модель загружена", self.color_scheme["success"]
+        return "❌ Ошибка загрузки модели", self.color_scheme["error"]
+
+    def poll_model_ready(self):
+        # Опрос готовности модели без блокировки интерфейса
+        if self.model_future is not None and not self.model_future.done():
+            self.root.after(MODEL_POLL_INTERVAL_MS, self.poll_model_ready)
+            return
+        self.wait_for_model()
+        print(self.startup_timer.report())
+        self.startup_timer.save()
+        if hasattr(self, "status_label") and self.status_label.winfo_exists():
+            status_text, status_color = self.model_status()
+            self.status_label.configure(text=status_text, text_color=status_color)
 
     def create_splash_widgets(self):
         # Фон для приветственного экрана
@@ -235,9 +268,8 @@ class ChessClassifierApp:
         self.setup_hotkeys()
         self.setup_drag_and_drop()
         
-        # Обновляем статус модели после загрузки
-        status_text = "✅ Модель загружена" if self.model_loaded else "❌ Ошибка загрузки модели"
-        status_color = self.color_scheme["success"] if self.model_loaded else self.color_scheme["error"]
+        # Обновляем статус модели (загрузка может ещё идти в фоне)
+        status_text, status_color = self.model_status()
         self.status_label.configure(text=status_text, text_color=status_color)
 
     def setup_menu(self):
@@ -302,6 +334,11 @@ class ChessClassifierApp:
             command=self.reset_statistics,
             font=self.styles["text"]
         )
+        stats_menu.add_command(
+            label="🔁 Пересчитать по истории",
+            command=self.rebuild_statistics,
+            font=self.styles["text"]
+        )
         
         # Меню инструментов
         tools_menu = tk.Menu(
@@ -440,7 +477,7 @@ class ChessClassifierApp:
         self.color_analysis_button = ctk.CTkButton(
             self.toolbar,
             text="🎨 Анализ цвета",
-            command=lambda: self.show_color_analysis(self.current_image_path) if hasattr(self, 'current_image_path') else messagebox.showinfo("Информация", "Сначала загрузите изображение"),
+            command=lambda: self.show_color_analysis(self.current_image) if hasattr(self, 'current_image') else messagebox.showinfo("Информация", "Сначала загрузите изображение"),
             font=self.styles["button"],
             height=45,
             width=200,
@@ -466,8 +503,7 @@ class ChessClassifierApp:
         self.title_label.pack(pady=15)
         
         # Статус модели с анимированной иконкой
-        status_text = "✅ Модель загружена" if self.model_loaded else "❌ Ошибка загрузки модели"
-        status_color = self.color_scheme["success"] if self.model_loaded else self.color_scheme["error"]
+        status_text, status_color = self.model_status()
         self.status_label = ctk.CTkLabel(
             self.main_container,
             text=status_text,
@@ -562,7 +598,17 @@ class ChessClassifierApp:
             self.table_frame,
             command=self.history_tree.yview
         )
-        self.history_tree.configure(yscrollcommand=scrollbar.set)
+        
+        def on_history_scroll(first, last):
+            scrollbar.set(first, last)
+            # Подгружаем следующую страницу, когда прокрутка подходит к концу
+            # (не больше одной отложенной загрузки на прокрутку)
+            if float(last) >= 0.9 and not self.history_page_pending:
+                self.history_page_pending = True
+                self.root.after_idle(self.load_history_page)
+        
+        self.history_page_pending = False
+        self.history_tree.configure(yscrollcommand=on_history_scroll)
         
         self.history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -665,11 +711,12 @@ class ChessClassifierApp:
         progress.pack(pady=10, padx=20, fill=tk.X)
         progress.set(confidence_value / 100)
     
-    def display_image(self, file_path):
+    def display_image(self, image):
         try:
-            # Загрузка и изменение размера изображения
-            img = Image.open(file_path)
-            img = self.resize_image(img, (300, 300))
+            # Миниатюра из уже декодированного изображения (или путь к файлу)
+            if not isinstance(image, DecodedImage):
+                image = DecodedImage(image)
+            img = image.thumbnail((300, 300))
             img_tk = ImageTk.PhotoImage(img)
             
             # Обновление метки с изображением
@@ -694,82 +741,26 @@ class ChessClassifierApp:
             )
             self.image_label.pack(expand=True)
     
-    def resize_image(self, img, size):
-        width, height = img.size
-        ratio = min(size[0]/width, size[1]/height)
-        new_width = int(width * ratio)
-        new_height = int(height * ratio)
-        return img.resize((new_width, new_height), Image.LANCZOS)
-    
-    def detect_color(self, file_path):
+    def detect_color(self, source):
         try:
-            # Открываем изображение в RGB
-            img = Image.open(file_path).convert("RGB")
-            arr = np.array(img)
-            
-            # Получаем размеры изображения
-            h, w, _ = arr.shape
-            
-            # Вычисляем центр и размер области для анализа
-            cx, cy = w // 2, h // 2
-            s = min(h, w) // 2  # Увеличиваем область анализа
-            
-            # Вырезаем центральную область
-            crop = arr[cy - s//2:cy + s//2, cx - s//2:cx + s//2]
-            
-            # Конвертируем в HSV для лучшего анализа цвета
-            hsv = cv2.cvtColor(crop, cv2.COLOR_RGB2HSV)
-            
-            # Определяем маску фигуры
-            # Используем адаптивный порог для определения фигуры
-            gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
-            blur = cv2.GaussianBlur(gray, (5, 5), 0)
-            thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                         cv2.THRESH_BINARY_INV, 11, 2)
-            
-            # Находим контуры
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            if not contours:
-                return "Не удалось определить цвет ❔", 0
-            
-            # Берем самый большой контур
-            main_contour = max(contours, key=cv2.contourArea)
-            
-            # Создаем маску для фигуры
-            mask = np.zeros_like(gray)
-            cv2.drawContours(mask, [main_contour], -1, 255, -1)
-            
-            # Анализируем цвет только внутри маски
-            figure_pixels = hsv[mask > 0]
-            
-            if len(figure_pixels) == 0:
-                return "Не удалось определить цвет ❔", 0
-            
-            # Анализируем насыщенность и яркость
-            saturation = figure_pixels[:, 1]
-            value = figure_pixels[:, 2]
-            
-            # Вычисляем средние значения
-            mean_saturation = np.mean(saturation)
-            mean_value = np.mean(value)
-            
-            # Определяем цвет на основе насыщенности и яркости
-            if mean_value < 100:  # Темные пиксели
-                return "Чёрная ♟️", mean_value
-            elif mean_value > 150 and mean_saturation < 50:  # Светлые пиксели с низкой насыщенностью
-                return "Белая ♙", mean_value
-            else:
-                # Дополнительный анализ для неоднозначных случаев
-                dark_ratio = np.sum(value < 127) / len(value)
-                return "Чёрная ♟️" if dark_ratio > 0.6 else "Белая ♙", mean_value
-                
+            from color_detection import detect_colors_batch, detect_colors_from_crops
+            # Принимает DecodedImage (кроп берётся из кэша), путь к файлу или PIL.Image / массив
+            if isinstance(source, DecodedImage):
+                labels, mean_values = detect_colors_from_crops(source.color_crop[np.newaxis])
+                return labels[0], mean_values[0]
+            img = Image.open(source) if isinstance(source, str) else source
+            labels, mean_values = detect_colors_batch([img])
+            return labels[0], mean_values[0]
         except Exception as e:
             return f"Ошибка определения цвета: {e}", 0
 
-    def show_color_analysis(self, file_path):
+    def show_color_analysis(self, image):
         try:
-            img = Image.open(file_path).convert("L")
+            import matplotlib.pyplot as plt
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            if not isinstance(image, DecodedImage):
+                image = DecodedImage(image)
+            img = image.original.convert("L")
             arr = np.array(img)
             h, w = arr.shape
             cx, cy = w // 2, h // 2
@@ -814,7 +805,7 @@ class ChessClassifierApp:
             canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
             
             # Добавляем информацию об анализе
-            color, mean = self.detect_color(file_path)
+            color, mean = self.detect_color(image)
             
             # Вычисляем дополнительные метрики
             threshold = 200
@@ -854,22 +845,18 @@ class ChessClassifierApp:
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось выполнить анализ: {e}")
     
-    def classify_image(self, file_path):
+    def classify_image(self, image):
         try:
-            fig_color, _ = self.detect_color(file_path)
+            if not isinstance(image, DecodedImage):
+                image = DecodedImage(image)
+            fig_color, _ = self.detect_color(image)
             
-            img = image.load_img(file_path, target_size=(224, 224))
-            x = image.img_to_array(img)
-            x = np.expand_dims(x, axis=0) / 255.0
-            
-            prediction = self.model.predict(x)[0]
-            idx = np.argmax(prediction)
-            confidence = float(np.max(prediction)) * 100
-            predicted_class = self.class_labels[list(self.class_labels.keys())[idx]]
+            prediction = self.engine.predict_batch([image])[0]
+            predicted_class, confidence = self.engine.top_prediction(prediction)
             
             self.show_result(predicted_class, fig_color, f"{confidence:.1f}%")
             self.save_to_history(
-                os.path.basename(file_path),
+                image.name,
                 predicted_class,
                 fig_color,
                 f"{confidence:.1f}%"
@@ -917,16 +904,24 @@ class ChessClassifierApp:
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
+        # Каждый файл декодируется один раз: миниатюра, вход модели и кроп цвета
+        # берутся из одного DecodedImage; классификация идёт пакетами по мере чтения
+        decoded_images = (DecodedImage(file_path) for file_path in file_paths)
+        if self.wait_for_model():
+            batch_results = self.engine.iter_predict(decoded_images)
+        else:
+            batch_results = ((image, None, None) for image in decoded_images)
+        
         # Обрабатываем каждое изображение
-        for file_path in file_paths:
+        for image, prediction, error in batch_results:
             # Создаем фрейм для каждого изображения и его результатов
             img_frame = ctk.CTkFrame(scrollable_frame)
             img_frame.pack(pady=10, padx=10, fill="x")
+            file_name = image.name
             
             try:
                 # Отображаем изображение
-                img = Image.open(file_path)
-                img = self.resize_image(img, (200, 200))
+                img = image.thumbnail((200, 200))
                 img_tk = ImageTk.PhotoImage(img)
                 
                 img_label = ctk.CTkLabel(
@@ -942,7 +937,6 @@ class ChessClassifierApp:
                 results_frame.pack(side="left", fill="both", expand=True, padx=10)
                 
                 # Имя файла
-                file_name = os.path.basename(file_path)
                 ctk.CTkLabel(
                     results_frame,
                     text=f"Файл: {file_name}",
@@ -951,17 +945,12 @@ class ChessClassifierApp:
                 
                 if self.model_loaded:
                     # Определяем цвет фигуры
-                    fig_color, _ = self.detect_color(file_path)
+                    fig_color, _ = self.detect_color(image)
                     
-                    # Классифицируем изображение
-                    img_tensor = image.load_img(file_path, target_size=(224, 224))
-                    x = image.img_to_array(img_tensor)
-                    x = np.expand_dims(x, axis=0) / 255.0
-                    
-                    prediction = self.model.predict(x, verbose=0)[0]
-                    idx = np.argmax(prediction)
-                    confidence = float(np.max(prediction)) * 100
-                    predicted_class = self.class_labels[list(self.class_labels.keys())[idx]]
+                    # Берём результат пакетной классификации
+                    if error is not None:
+                        raise error
+                    predicted_class, confidence = self.engine.top_prediction(prediction)
                     
                     # Отображаем результаты
                     ctk.CTkLabel(
@@ -1013,58 +1002,51 @@ class ChessClassifierApp:
                 ).pack()
     
     def load_history(self):
-        if os.path.exists(self.log_file):
-            try:
-                # Исправляем чтение CSV файла
-                df_log = pd.read_csv(self.log_file, encoding='utf-8')
-                
-                # Очистка таблицы
-                for item in self.history_tree.get_children():
-                    self.history_tree.delete(item)
-                
-                # Заполнение таблицы
-                for _, row in df_log.iterrows():
-                    self.history_tree.insert("", tk.END, values=(
-                        row.get("Файл", ""),
-                        row.get("Класс", ""),
-                        row.get("Цвет", ""),
-                        row.get("Уверенность", "")
-                    ))
-            except Exception as e:
-                print(f"Ошибка загрузки истории: {e}")
+        # Очистка таблицы
+        self.history_tree.delete(*self.history_tree.get_children())
+        
+        # Сколько записей уже показано и есть ли ещё страницы в хранилище
+        self.history_offset = 0
+        self.history_exhausted = False
+        self.load_history_page()
+    
+    def load_history_page(self):
+        # Таблица хранит только просмотренные страницы (новые записи сверху)
+        self.history_page_pending = False
+        if self.history_exhausted:
+            return
+        try:
+            rows = self.history_store.query(
+                offset=self.history_offset,
+                limit=HISTORY_PAGE_SIZE,
+                newest_first=True
+            )
+            for row in rows:
+                self.history_tree.insert("", tk.END, values=row)
+            self.history_offset += len(rows)
+            self.history_exhausted = len(rows) < HISTORY_PAGE_SIZE
+        except Exception as e:
+            self.history_exhausted = True
+            print(f"Ошибка загрузки истории: {e}")
     
     def save_to_history(self, file_name, class_name, color, confidence):
-        # Добавление в таблицу
+        # Добавление в таблицу (сдвигает смещение следующей страницы)
         self.history_tree.insert("", 0, values=(file_name, class_name, color, confidence))
+        self.history_offset += 1
         
-        # Сохранение в CSV
-        new_entry = pd.DataFrame([{
-            "Файл": file_name,
-            "Класс": class_name,
-            "Цвет": color,
-            "Уверенность": confidence
-        }])
-        
-        if os.path.exists(self.log_file):
-            try:
-                current = pd.read_csv(self.log_file, encoding='utf-8')
-                if set(current.columns) == set(new_entry.columns):
-                    new_entry.to_csv(self.log_file, mode='a', index=False, header=False, encoding='utf-8-sig')
-                else:
-                    new_entry.to_csv(self.log_file, index=False, encoding='utf-8-sig')
-            except:
-                new_entry.to_csv(self.log_file, index=False, encoding='utf-8-sig')
-        else:
-            new_entry.to_csv(self.log_file, index=False, encoding='utf-8-sig')
+        # Дописывание в CSV без перечитывания лога
+        self.history_store.append((file_name, class_name, color, confidence))
     
     def process_image(self, file_path):
+        # Файл декодируется один раз для отображения, анализа цвета и классификации
         self.current_image_path = file_path  # Сохраняем путь к текущему изображению
-        self.display_image(file_path)
-        if self.model_loaded:
-            self.classify_image(file_path)
+        self.current_image = DecodedImage(file_path)
+        self.display_image(self.current_image)
+        if self.wait_for_model():
+            self.classify_image(self.current_image)
     
     def export_history(self):
-        if not os.path.exists(self.log_file):
+        if self.history_store.count() == 0:
             messagebox.showwarning("Предупреждение", "Нет данных для экспорта")
             return
         
@@ -1080,7 +1062,7 @@ class ChessClassifierApp:
         if not file_path:
             return
             
-        df = pd.read_csv(self.log_file, encoding='utf-8')
+        df = self.history_store.to_dataframe()
         
         if file_path.endswith('.xlsx'):
             df.to_excel(file_path, index=False)
@@ -1092,6 +1074,10 @@ class ChessClassifierApp:
         messagebox.showinfo("Успех", "Данные успешно экспортированы")
     
     def show_statistics(self):
+        # matplotlib загружается только при открытии окна статистики
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
         stats_window = ctk.CTkToplevel(self.root)
         stats_window.title("Статистика классификаций")
         stats_window.geometry("800x600")
@@ -1140,42 +1126,31 @@ class ChessClassifierApp:
     
     def reset_statistics(self):
         if messagebox.askyesno("Подтверждение", "Вы уверены, что хотите сбросить статистику?"):
-            self.stats = {
-                "total_classifications": 0,
-                "by_class": {},
-                "by_color": {"Белая ♙": 0, "Чёрная ♟️": 0}
-            }
+            self.stats_aggregator.reset()
             self.save_stats()
             messagebox.showinfo("Успех", "Статистика сброшена")
     
-    def load_stats(self):
+    def rebuild_statistics(self):
+        # Пересчёт статистики по всей истории предсказаний
         try:
-            if os.path.exists('stats.json'):
-                with open('stats.json', 'r', encoding='utf-8') as f:
-                    self.stats = json.load(f)
+            self.stats_aggregator.rebuild_from_history(self.history_store.query())
+            self.save_stats()
+            messagebox.showinfo("Успех", f"Статистика пересчитана: {self.stats['total_classifications']} записей")
         except Exception as e:
-            print(f"Ошибка загрузки статистики: {e}")
+            messagebox.showerror("Ошибка", f"Не удалось пересчитать статистику:\n{str(e)}")
+    
+    def load_stats(self):
+        self.stats_aggregator.load()
     
     def save_stats(self):
-        try:
-            with open('stats.json', 'w', encoding='utf-8') as f:
-                json.dump(self.stats, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Ошибка сохранения статистики: {e}")
+        self.stats_aggregator.flush()
     
     def update_stats(self, class_name, color):
-        self.stats['total_classifications'] += 1
-        
-        if class_name not in self.stats['by_class']:
-            self.stats['by_class'][class_name] = 0
-        self.stats['by_class'][class_name] += 1
-        
-        if color in self.stats['by_color']:
-            self.stats['by_color'][color] += 1
-            
-        self.save_stats()
+        # Только обновление в памяти; запись на диск выполняет агрегатор
+        self.stats_aggregator.update(class_name, color)
 
     def add_tooltips(self):
+        from idlelib.tooltip import Hovertip
         Hovertip(self.upload_button, "Загрузить изображение для классификации")
         Hovertip(self.stats_button, "Просмотр статистики классификаций")
         Hovertip(self.color_analysis_button, "Показать детальный анализ определения цвета фигуры")
@@ -1223,71 +1198,107 @@ class ChessClassifierApp:
             progress_bar.set(0)
 
             processed_count = 0
+            batch_done = False
+            file_order = {file_path: i for i, file_path in enumerate(image_files)}
 
-            def process_batch():
-                nonlocal processed_count
-                results = []
-                for i, file_path in enumerate(image_files):
-                    try:
-                        # Используем функцию process_image для обработки каждого файла
-                        # Однако, process_image обновляет основной GUI, что вызовет ошибку в отдельном потоке
-                        # Поэтому скопируем логику обработки сюда или вынесем её
-                        # Временно скопируем логику обработки для пакетного режима
-                        # В реальном проекте лучше вынести логику классификации в отдельную функцию
-                        fig_color, _ = self.detect_color(file_path)
+            def prepare(file_path):
+                # Выполняется в пуле декодеров: файл декодируется один раз,
+                # из него готовятся вход модели и центральный кроп для анализа цвета
+                image = DecodedImage(file_path)
+                return image.model_input, image.color_crop
 
-                        if self.model_loaded:
-                            img_tensor = image.load_img(file_path, target_size=(224, 224))
-                            x = image.img_to_array(img_tensor)
-                            x = np.expand_dims(x, axis=0) / 255.0
+            def detect_batch_colors(crops):
+                # Цвет определяется для всего пакета кропов сразу
+                from color_detection import detect_colors_from_crops
+                labels, _ = detect_colors_from_crops(np.stack(crops))
+                return list(labels)
 
-                            prediction = self.model.predict(x, verbose=0)[0]
-                            idx = np.argmax(prediction)
-                            confidence = float(np.max(prediction)) * 100
-                            predicted_class = self.class_labels[list(self.class_labels.keys())[idx]]
+            def error_row(file_path):
+                return {
+                    "Файл": os.path.basename(file_path),
+                    "Класс": "Ошибка",
+                    "Цвет": "Ошибка",
+                    "Уверенность": "0%"
+                }
+
+            def process_batch():
+                nonlocal processed_count, batch_done
+                results = []
+                pending_rows = []
+                # Пул потоков декодирует файлы, этот поток выполняет пакетный инференс.
+                # Если модель ещё загружается, ждём её здесь, не блокируя интерфейс.
+                if self.wait_for_model():
+                    predictions = self.engine.iter_predict_pipelined(
+                        image_files, prepare, process_extras=detect_batch_colors
+                    )
+                else:
+                    predictions = ((file_path, None, None, None) for file_path in image_files)
 
-                            results.append({
+                done = set()
+                try:
+                    for file_path, prediction, fig_color, error in predictions:
+                        if error is not None:
+                            print(f"Ошибка обработки файла {file_path}: {error}")
+                            results.append((file_order[file_path], error_row(file_path)))
+                        elif prediction is None:
+                            results.append((file_order[file_path], error_row(file_path)))
+                        else:
+                            predicted_class, confidence = self.engine.top_prediction(prediction)
+                            row = {
                                 "Файл": os.path.basename(file_path),
                                 "Класс": predicted_class,
                                 "Цвет": fig_color,
                                 "Уверенность": f"{confidence:.1f}%"
-                            })
+                            }
+                            results.append((file_order[file_path], row))
+                            pending_rows.append(row)
 
-                            # Обновляем статистику (нужно делать в основном потоке Tkinter)
-                            self.root.after(0, self.update_stats, predicted_class, fig_color)
-                            self.root.after(0, self.save_to_history, os.path.basename(file_path), predicted_class, fig_color, f"{confidence:.1f}%")
+                        done.add(file_path)
+                        processed_count += 1
 
-                        else:
-                            results.append({
-                                "Файл": os.path.basename(file_path),
-                                "Класс": "Ошибка",
-                                "Цвет": "Ошибка",
-                                "Уверенность": "0%"
-                            })
+                        # История и статистика передаются в основной поток Tkinter пачками
+                        if len(pending_rows) >= self.engine.batch_size:
+                            self.root.after(0, self.record_batch_results, pending_rows)
+                            pending_rows = []
+                except Exception as e:
+                    # Сбой модели не должен оставлять окно прогресса открытым:
+                    # необработанные файлы попадают в результаты как ошибки
+                    print(f"Ошибка пакетной обработки: {e}")
+                    for file_path in image_files:
+                        if file_path not in done:
+                            results.append((file_order[file_path], error_row(file_path)))
+                finally:
+                    if pending_rows:
+                        self.root.after(0, self.record_batch_results, pending_rows)
 
-                    except Exception as e:
-                        print(f"Ошибка обработки файла {file_path}: {e}")
-                        results.append({
-                             "Файл": os.path.basename(file_path),
-                             "Класс": "Ошибка",
-                             "Цвет": "Ошибка",
-                             "Уверенность": "0%"
-                        })
+                    # Возвращаем исходный порядок файлов
+                    results = [row for _, row in sorted(results, key=lambda item: item[0])]
+                    batch_done = True
 
-                    processed_count += 1
-                    progress = processed_count / total_files
-                    # Обновляем GUI (нужно делать в основном потоке Tkinter)
-                    self.root.after(0, progress_bar.set, progress)
-                    self.root.after(0, progress_label.configure, text=f"Обработка изображений... {processed_count}/{total_files}")
-
-
-                # После завершения обработки, показываем сводку результатов и закрываем окно прогресса
-                self.root.after(0, progress_window.destroy)
-                self.root.after(0, self.show_batch_results, results) # Показываем результаты в новом окне
+                    # После завершения обработки, показываем сводку результатов и закрываем окно прогресса
+                    self.root.after(0, progress_window.destroy)
+                    self.root.after(0, self.show_batch_results, results) # Показываем результаты в новом окне
 
+            def update_progress():
+                # Прогресс опрашивается с фиксированной частотой, а не на каждый файл
+                if batch_done or not progress_window.winfo_exists():
+                    return
+                progress_bar.set(processed_count / total_files)
+                progress_label.configure(text=f"Обработка изображений... {processed_count}/{total_files}")
+                self.root.after(BATCH_PROGRESS_INTERVAL_MS, update_progress)
 
             # Запускаем обработку в отдельном потоке, чтобы не зависал GUI
-            threading.Thread(target=process_batch).start()
+            threading.Thread(target=process_batch, daemon=True).start()
+            self.root.after(BATCH_PROGRESS_INTERVAL_MS, update_progress)
+
+    def record_batch_results(self, rows):
+        """Сохраняет пачку результатов пакетной обработки в историю и статистику."""
+        for row in rows:
+            self.history_tree.insert("", 0, values=(row["Файл"], row["Класс"], row["Цвет"], row["Уверенность"]))
+        self.history_offset += len(rows)
+        self.stats_aggregator.update_many((row["Класс"], row["Цвет"]) for row in rows)
+        # Одна запись в лог на всю пачку
+        self.history_store.append_many(rows)
 
     def show_batch_results(self, results):
         """Отображает результаты пакетной обработки в новом окне."""
@@ -1460,8 +1471,8 @@ class ChessClassifierApp:
                 img_frame.pack(side=tk.LEFT, padx=10, fill=tk.BOTH, expand=True)
                 
                 # Загружаем и отображаем изображение
-                img = Image.open(file_path)
-                img = self.resize_image(img, (200, 200))
+                image = DecodedImage(file_path)
+                img = image.thumbnail((200, 200))
                 img_tk = ImageTk.PhotoImage(img)
                 
                 img_label = ctk.CTkLabel(
@@ -1473,15 +1484,9 @@ class ChessClassifierApp:
                 img_label.pack(pady=5)
                 
                 # Классифицируем изображение
-                if self.model_loaded:
-                    img_tensor = image.load_img(file_path, target_size=(224, 224))
-                    x = image.img_to_array(img_tensor)
-                    x = np.expand_dims(x, axis=0) / 255.0
-                    
-                    prediction = self.model.predict(x, verbose=0)[0]
-                    idx = np.argmax(prediction)
-                    confidence = float(np.max(prediction)) * 100
-                    predicted_class = self.class_labels[list(self.class_labels.keys())[idx]]
+                if self.wait_for_model():
+                    prediction = self.engine.predict_batch([image])[0]
+                    predicted_class, confidence = self.engine.top_prediction(prediction)
                     
                     # Отображаем результаты
                     result_label = ctk.CTkLabel(
@@ -5,12 +5,12 @@ a = Analysis(
     ['chess_classifier_gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('final_model.h5', '.')],
-    hiddenimports=[],
+    datas=[('final_model.onnx', '.')],
+    hiddenimports=['onnxruntime'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['tensorflow', 'keras', 'tensorboard', 'tf2onnx'],
     noarchive=False,
     optimize=0,
 )
@@ -0,0 +1,363 @@
+import os
+import sys
+import queue
+import itertools
+import contextlib
+import threading
+from concurrent.futures import Future
+import numpy as np
+from PIL import Image
+
+# Параметры инференса
+IMG_SIZE = 224
+BATCH_SIZE = 32
+MODEL_FILE = "final_model.h5"
+TFLITE_MODEL_FILE = os.environ.get("CHESS_TFLITE_MODEL", "final_model_float16.tflite")
+ONNX_MODEL_FILE = os.environ.get("CHESS_ONNX_MODEL", "final_model.onnx")
+# Бэкенд инференса: "keras", "tflite" или "onnx".
+# Собранное приложение (PyInstaller) поставляется без TensorFlow и по умолчанию использует ONNX Runtime.
+MODEL_BACKEND = os.environ.get("CHESS_MODEL_BACKEND", "onnx" if getattr(sys, 'frozen', False) else "keras")
+MODEL_FILES = {
+    "keras": MODEL_FILE,
+    "tflite": TFLITE_MODEL_FILE,
+    "onnx": ONNX_MODEL_FILE,
+}
+DECODE_WORKERS = os.cpu_count() or 4
+
+# Маркер завершения работы потока-декодера
+_DONE = object()
+
+# Классы фигур (порядок совпадает с выходами модели)
+CLASS_LABELS = {
+    'bishop': 'Слон 🐘',
+    'knight': 'Конь 🐴',
+    'pawn': 'Пешка 🧍‍♂️',
+    'queen': 'Ферзь 👑',
+    'rook': 'Ладья 🏰'
+}
+
+def get_base_path():
+    """
+    Возвращает каталог с ресурсами (учитывает запуск из PyInstaller)
+    """
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    return os.path.dirname(os.path.abspath(__file__))
+
+def default_model_path(backend=MODEL_BACKEND):
+    """
+    Путь к файлу модели для выбранного бэкенда
+    """
+    if backend not in MODEL_FILES:
+        raise ValueError(f"Неизвестный бэкенд модели: {backend}")
+    return os.path.join(get_base_path(), MODEL_FILES[backend])
+
+def load_classifier(model_path=None, backend=MODEL_BACKEND):
+    """
+    Загружает модель классификатора (Keras, TFLite или ONNX) с методом predict_on_batch
+    """
+    if model_path is None:
+        model_path = default_model_path(backend)
+
+    if backend == "onnx":
+        from onnx_backend import ONNXModel
+        return ONNXModel(model_path)
+    if backend == "tflite":
+        from tflite_backend import TFLiteModel
+        return TFLiteModel(model_path)
+    if backend != "keras":
+        raise ValueError(f"Неизвестный бэкенд модели: {backend}")
+
+    # TensorFlow импортируется только при реальной загрузке модели
+    from tensorflow.keras.models import load_model
+    return load_model(model_path)
+
+def load_engine_async(model_path=None, class_labels=CLASS_LABELS, timer=None):
+    """
+    Загружает модель и прогревает движок в фоновом потоке.
+    Возвращает Future, который завершится готовым InferenceEngine (или исключением загрузки).
+    timer (StartupTimer) получает замеры этапов model_load и first_predict.
+    """
+    future = Future()
+
+    def measure(stage):
+        return timer.measure(stage) if timer is not None else contextlib.nullcontext()
+
+    def worker():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with measure("model_load"):
+                model = load_classifier(model_path)
+            engine = InferenceEngine(model, class_labels)
+            # Первый вызов строит граф — выполняем его здесь, а не на первом клике
+            with measure("first_predict"):
+                engine.warmup()
+            future.set_result(engine)
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=worker, name="model-loader", daemon=True).start()
+    return future
+
+class DecodedImage:
+    """
+    Изображение, которое читается и декодируется один раз за классификацию.
+    Вход модели, миниатюры и кроп для анализа цвета вычисляются лениво и кэшируются.
+    Декодирование тоже ленивое: ошибка чтения файла проявится при первом обращении.
+    """
+
+    def __init__(self, source, name=None):
+        self.source = source
+        if name is None:
+            name = os.path.basename(source) if isinstance(source, str) else getattr(source, 'name', '')
+        self.name = name
+        self._original = None
+        self._rgb = None
+        self._model_input = None
+        self._color_crop = None
+        self._thumbnails = {}
+
+    def load(self):
+        """
+        Принудительно декодирует файл (для ранней проверки ошибок)
+        """
+        if self._original is None:
+            img = Image.open(self.source)
+            img.load()
+            self._original = img
+        return self
+
+    @property
+    def original(self):
+        # Изображение как есть (с прозрачностью) — для отображения
+        return self.load()._original
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            original = self.original
+            self._rgb = original if original.mode == 'RGB' else original.convert('RGB')
+        return self._rgb
+
+    @property
+    def array(self):
+        return np.asarray(self.rgb)
+
+    @property
+    def model_input(self):
+        if self._model_input is None:
+            self._model_input = preprocess_image(self.rgb)
+        return self._model_input
+
+    @property
+    def color_crop(self):
+        if self._color_crop is None:
+            from color_detection import extract_color_crop
+            self._color_crop = extract_color_crop(self.rgb)
+        return self._color_crop
+
+    def thumbnail(self, size):
+        """
+        Миниатюра, вписанная в size с сохранением пропорций
+        """
+        size = tuple(size)
+        if size not in self._thumbnails:
+            width, height = self.original.size
+            ratio = min(size[0]/width, size[1]/height)
+            new_size = (int(width * ratio), int(height * ratio))
+            self._thumbnails[size] = self.original.resize(new_size, Image.LANCZOS)
+        return self._thumbnails[size]
+
+def preprocess_image(source, target_size=(IMG_SIZE, IMG_SIZE)):
+    """
+    Приводит изображение (путь, файловый объект, PIL.Image, DecodedImage или массив) ко входу модели
+    """
+    if isinstance(source, DecodedImage):
+        if target_size == (IMG_SIZE, IMG_SIZE):
+            return source.model_input
+        source = source.rgb
+
+    if isinstance(source, np.ndarray):
+        if source.shape[:2] == target_size and source.dtype == np.float32:
+            return source
+        img = Image.fromarray(source.astype(np.uint8))
+    elif isinstance(source, Image.Image):
+        img = source
+    else:
+        img = Image.open(source)
+
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    # Ресайз как в keras.preprocessing.image.load_img (interpolation='nearest')
+    if img.size != target_size:
+        img = img.resize(target_size, Image.NEAREST)
+
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+class InferenceEngine:
+    """
+    Общий движок классификации: группирует изображения в пакеты
+    и вызывает модель один раз на пакет
+    """
+
+    def __init__(self, model, class_labels=CLASS_LABELS, batch_size=BATCH_SIZE):
+        self.model = model
+        self.class_labels = class_labels
+        self.class_names = list(class_labels.values())
+        self.batch_size = max(1, int(batch_size))
+
+    def warmup(self):
+        """
+        Прогревает модель пустым пакетом, чтобы первый реальный вызов не строил граф
+        """
+        self.predict_arrays(np.zeros((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32))
+        return self
+
+    def predict_arrays(self, x):
+        """
+        Предсказание для уже подготовленного тензора (N, 224, 224, 3)
+        """
+        outputs = []
+        for start in range(0, len(x), self.batch_size):
+            batch = x[start:start + self.batch_size]
+            # predict_on_batch не создаёт data adapter на каждый вызов, в отличие от predict
+            outputs.append(np.asarray(self.model.predict_on_batch(batch)))
+        if not outputs:
+            return np.zeros((0, len(self.class_names)), dtype=np.float32)
+        return np.concatenate(outputs, axis=0)
+
+    def iter_predict(self, sources):
+        """
+        Генератор (источник, вероятности, ошибка) с одним вызовом модели на пакет.
+        Источники читаются порциями, поэтому в памяти одновременно не больше одного пакета.
+        Ошибка декодирования одного файла не прерывает обработку остальных.
+        """
+        sources = iter(sources)
+        while True:
+            chunk = list(itertools.islice(sources, self.batch_size))
+            if not chunk:
+                break
+            arrays, errors = [], {}
+            for i, source in enumerate(chunk):
+                try:
+                    arrays.append(preprocess_image(source))
+                except Exception as e:
+                    errors[i] = e
+
+            predictions = iter(self.predict_arrays(np.stack(arrays)) if arrays else [])
+            for i, source in enumerate(chunk):
+                if i in errors:
+                    yield source, None, errors[i]
+                else:
+                    yield source, next(predictions), None
+
+    def predict_batch(self, sources):
+        """
+        Возвращает матрицу вероятностей (N, число классов) для списка путей или массивов
+        """
+        results = []
+        for source, prediction, error in self.iter_predict(sources):
+            if error is not None:
+                raise error
+            results.append(prediction)
+        if not results:
+            return np.zeros((0, len(self.class_names)), dtype=np.float32)
+        return np.stack(results)
+
+    def top_k(self, probabilities, k=3):
+        """
+        Векторизованный топ-k для матрицы вероятностей (N, число классов).
+        Возвращает (индексы классов, вероятности), обе формы (N, k).
+        """
+        probabilities = np.atleast_2d(probabilities)
+        k = min(k, probabilities.shape[1])
+        indices = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+        return indices, np.take_along_axis(probabilities, indices, axis=1)
+
+    def top_prediction(self, prediction):
+        """
+        Возвращает (название класса, уверенность в %) для вектора вероятностей
+        """
+        idx = int(np.argmax(prediction))
+        confidence = float(prediction[idx]) * 100
+        return self.class_names[idx], confidence
+
+    def iter_predict_pipelined(self, sources, prepare=None, num_workers=DECODE_WORKERS, queue_size=None,
+                               process_extras=None):
+        """
+        Конвейер производитель/потребитель: пул потоков декодирует изображения
+        в ограниченную очередь, текущий поток собирает пакеты и вызывает модель.
+        prepare(source) должен вернуть (массив для модели, доп. данные).
+        process_extras(список доп. данных) вызывается один раз на пакет вместе с моделью
+        (например, пакетное определение цвета) и возвращает новые доп. данные.
+        Выдаёт (источник, вероятности, доп. данные, ошибка) в порядке готовности.
+        """
+        if prepare is None:
+            prepare = lambda source: (preprocess_image(source), None)
+        if queue_size is None:
+            queue_size = self.batch_size * 4
+
+        pending = iter(list(sources))
+        pending_lock = threading.Lock()
+        stop = threading.Event()
+        ready = queue.Queue(maxsize=queue_size)
+
+        def put(item):
+            # Не блокируемся навсегда, если потребитель прекратил чтение
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def decode_worker():
+            while not stop.is_set():
+                with pending_lock:
+                    source = next(pending, _DONE)
+                if source is _DONE:
+                    break
+                try:
+                    array, extra = prepare(source)
+                    put((source, array, extra, None))
+                except Exception as e:
+                    put((source, None, None, e))
+            put(_DONE)
+
+        num_workers = max(1, int(num_workers))
+        workers = [threading.Thread(target=decode_worker, daemon=True) for _ in range(num_workers)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            finished = 0
+            batch = []
+            while finished < num_workers:
+                item = ready.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                source, array, extra, error = item
+                if error is not None:
+                    yield source, None, extra, error
+                    continue
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    yield from self._predict_prepared(batch, process_extras)
+                    batch = []
+            if batch:
+                yield from self._predict_prepared(batch, process_extras)
+        finally:
+            stop.set()
+
+    def _predict_prepared(self, batch, process_extras=None):
+        """
+        Один вызов модели для пакета уже декодированных изображений
+        """
+        predictions = self.predict_arrays(np.stack([array for _, array, _, _ in batch]))
+        extras = [extra for _, _, extra, _ in batch]
+        if process_extras is not None:
+            extras = process_extras(extras)
+        for (source, _, _, _), prediction, extra in zip(batch, predictions, extras):
+            yield source, prediction, extra, None
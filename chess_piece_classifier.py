@@ -6,12 +6,27 @@ from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau
 from sklearn.utils.class_weight import compute_class_weight
 import matplotlib.pyplot as plt
+from dataset_manifest import DATASET_MANIFEST, flow_from_source
 
 # Константы
 IMG_SIZE = 224
 BATCH_SIZE = 64
 EPOCHS = 20
 LEARNING_RATE = 0.001
+# Обучение головы на закэшированных эмбеддингах (CHESS_EMBEDDING_CACHE=1)
+USE_EMBEDDING_CACHE = os.environ.get("CHESS_EMBEDDING_CACHE") == "1"
+# Загрузчик данных: "tf.data" (по умолчанию), "packed" (шарды data/packed) или "generator" (ImageDataGenerator)
+DATA_LOADER = os.environ.get("CHESS_DATA_LOADER", "tf.data")
+# Аугментация на лету в загрузчиках tf.data/packed (те же преобразования, что и у генератора)
+AUGMENTATION_SEED = 42
+AUGMENTATION_PARAMS = {
+    "rotation_range": 10,
+    "width_shift_range": 0.1,
+    "height_shift_range": 0.1,
+    "shear_range": 0.1,
+    "zoom_range": 0.1,
+    "horizontal_flip": True,
+}
 
 def create_data_generators(train_dir, val_dir):
     # Аугментация данных для тренировочного набора
@@ -30,16 +45,16 @@ def create_data_generators(train_dir, val_dir):
     val_datagen = ImageDataGenerator(rescale=1./255)
 
     # Создаем генераторы
-    train_generator = train_datagen.flow_from_directory(
-        train_dir,
+    train_generator = flow_from_source(
+        train_datagen, train_dir, "train",
         target_size=(IMG_SIZE, IMG_SIZE),
         batch_size=BATCH_SIZE,
         class_mode='categorical',
         shuffle=True
     )
 
-    validation_generator = val_datagen.flow_from_directory(
-        val_dir,
+    validation_generator = flow_from_source(
+        val_datagen, val_dir, "val",
         target_size=(IMG_SIZE, IMG_SIZE),
         batch_size=BATCH_SIZE,
         class_mode='categorical',
@@ -99,10 +114,10 @@ def compute_class_weights(generator):
     )
     return dict(enumerate(class_weights))
 
-def train_model(use_simple_cnn=False):
-    # Пути к данным
-    train_dir = 'data/balanced_train'
-    val_dir = 'data/balanced_val'
+def train_model(use_simple_cnn=False, use_embedding_cache=USE_EMBEDDING_CACHE):
+    # Пути к данным: каталоги или манифест со сплитами train/val (CHESS_DATASET_MANIFEST)
+    train_dir = DATASET_MANIFEST or 'data/balanced_train'
+    val_dir = DATASET_MANIFEST or 'data/balanced_val'
 
     # Создаем генераторы данных с дополнительной аугментацией на лету
     train_datagen = ImageDataGenerator(
@@ -120,23 +135,40 @@ def train_model(use_simple_cnn=False):
 
     classes = ['bishop', 'knight', 'pawn', 'queen', 'rook']
     
-    train_generator = train_datagen.flow_from_directory(
-        train_dir,
-        target_size=(IMG_SIZE, IMG_SIZE),
-        batch_size=BATCH_SIZE,
-        classes=classes,
-        class_mode='categorical',
-        shuffle=True
-    )
+    if DATA_LOADER == "tf.data":
+        # Параллельное декодирование, аугментация на пакетах и prefetch
+        from tf_data_loader import make_augmentation, make_dataset
+        augmentation = make_augmentation(AUGMENTATION_SEED, **AUGMENTATION_PARAMS)
+        train_generator = make_dataset(train_dir, classes, BATCH_SIZE, training=True, augmentation=augmentation,
+                                       seed=AUGMENTATION_SEED, split="train")
+        validation_generator = make_dataset(val_dir, classes, BATCH_SIZE, cache=True, split="val")
+    elif DATA_LOADER == "packed":
+        # Последовательное чтение упакованных шардов uint8 без декодирования файлов
+        from packed_dataset import load_packed
+        from tf_data_loader import make_augmentation
+        augmentation = make_augmentation(AUGMENTATION_SEED, **AUGMENTATION_PARAMS)
+        train_generator = load_packed(train_dir, classes, split="train").to_tf_dataset(
+            BATCH_SIZE, training=True, augmentation=augmentation, seed=AUGMENTATION_SEED
+        )
+        validation_generator = load_packed(val_dir, classes, split="val").to_tf_dataset(BATCH_SIZE)
+    else:
+        train_generator = flow_from_source(
+            train_datagen, train_dir, "train",
+            target_size=(IMG_SIZE, IMG_SIZE),
+            batch_size=BATCH_SIZE,
+            classes=classes,
+            class_mode='categorical',
+            shuffle=True
+        )
 
-    validation_generator = val_datagen.flow_from_directory(
-        val_dir,
-        target_size=(IMG_SIZE, IMG_SIZE),
-        batch_size=BATCH_SIZE,
-        classes=classes,
-        class_mode='categorical',
-        shuffle=False
-    )
+        validation_generator = flow_from_source(
+            val_datagen, val_dir, "val",
+            target_size=(IMG_SIZE, IMG_SIZE),
+            batch_size=BATCH_SIZE,
+            classes=classes,
+            class_mode='categorical',
+            shuffle=False
+        )
 
     if use_simple_cnn:
         model = create_simple_cnn_model(num_classes=len(classes))
@@ -169,12 +201,26 @@ def train_model(use_simple_cnn=False):
         )
     ]
 
-    history = model.fit(
-        train_generator,
-        epochs=EPOCHS,
-        validation_data=validation_generator,
-        callbacks=callbacks
-    )
+    if use_embedding_cache:
+        # База заморожена: голова обучается на закэшированных признаках,
+        # лучшие веса восстанавливает EarlyStopping, модель сохраняется целиком
+        from embedding_cache import train_head_on_cache
+        history = train_head_on_cache(
+            model, train_dir, val_dir,
+            classes=classes,
+            epochs=EPOCHS,
+            batch_size=BATCH_SIZE,
+            learning_rate=LEARNING_RATE,
+            callbacks=callbacks[1:]
+        )
+        model.save('best_model_5classes.keras')
+    else:
+        history = model.fit(
+            train_generator,
+            epochs=EPOCHS,
+            validation_data=validation_generator,
+            callbacks=callbacks
+        )
 
     return model, history
 
@@ -225,9 +271,9 @@ def print_model_summary(model):
     model.summary(show_trainable=True)
 
 if __name__ == "__main__":
-    # Создаем генераторы данных
-    train_dir = 'data/balanced_train'
-    val_dir = 'data/balanced_val'
+    # Создаем генераторы данных (каталоги или сплиты манифеста CHESS_DATASET_MANIFEST)
+    train_dir = DATASET_MANIFEST or 'data/balanced_train'
+    val_dir = DATASET_MANIFEST or 'data/balanced_val'
     
     train_datagen = ImageDataGenerator(
         rescale=1./255,
@@ -240,8 +286,8 @@ if __name__ == "__main__":
         fill_mode='nearest'
     )
 
-    train_generator = train_datagen.flow_from_directory(
-        train_dir,
+    train_generator = flow_from_source(
+        train_datagen, train_dir, "train",
         target_size=(IMG_SIZE, IMG_SIZE),
         batch_size=BATCH_SIZE,
         class_mode='categorical',
@@ -258,4 +304,12 @@ if __name__ == "__main__":
     
     # Обучаем модель
     model, history = train_model(use_simple_cnn=False)
-    plot_training_history(history) 
\ No newline at end of file
+    plot_training_history(history)
+    
+    # Экспорт в ONNX для приложения без TensorFlow
+    try:
+        from export_onnx import export_onnx, verify_onnx
+        export_onnx(model, 'best_model_5classes.onnx')
+        verify_onnx(model, 'best_model_5classes.onnx', val_dir)
+    except ImportError as e:
+        print(f"Экспорт в ONNX пропущен (нужны tf2onnx и onnxruntime): {e}") 
\ No newline at end of file
@@ -0,0 +1,100 @@
+import numpy as np
+import cv2
+from PIL import Image
+
+# Размер центральной области, к которому приводятся кропы для пакетного анализа
+# (центр 224x224 изображения — для него результат совпадает с анализом без ресайза)
+COLOR_CROP_SIZE = 112
+
+BLACK = "Чёрная ♟️"
+WHITE = "Белая ♙"
+UNKNOWN = "Не удалось определить цвет ❔"
+
+def to_rgb_array(image):
+    """
+    Возвращает RGB-массив uint8 из PIL.Image или уже декодированного массива
+    """
+    if isinstance(image, Image.Image):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return np.asarray(image)
+    arr = np.asarray(image)
+    if arr.ndim == 2:
+        arr = np.stack([arr] * 3, axis=-1)
+    return arr[..., :3].astype(np.uint8, copy=False)
+
+def center_crop(arr, fraction=2):
+    """
+    Центральная квадратная область со стороной min(h, w) // fraction
+    """
+    h, w = arr.shape[:2]
+    cx, cy = w // 2, h // 2
+    s = min(h, w) // fraction
+    return arr[cy - s//2:cy + s//2, cx - s//2:cx + s//2]
+
+def extract_color_crop(image, size=COLOR_CROP_SIZE):
+    """
+    Центральный кроп для анализа цвета, приведённый к size x size
+    """
+    crop = center_crop(to_rgb_array(image))
+    if crop.shape[:2] != (size, size):
+        crop = cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA)
+    return crop
+
+def detect_colors_from_crops(crops):
+    """
+    Пакетное определение цвета по стеку кропов (N, S, S, 3) uint8 RGB.
+    Попиксельные преобразования (HSV, оттенки серого) выполняются одним вызовом
+    для всей пачки, маска фигуры строится по маленьким кропам фиксированного размера,
+    средние по маске и правило выбора цвета векторизованы.
+    Возвращает (метки цвета, средняя яркость фигуры) — массивы длины N.
+    """
+    crops = np.ascontiguousarray(crops, dtype=np.uint8)
+    if len(crops) == 0:
+        return np.array([], dtype=object), np.array([], dtype=np.float32)
+    n, h, w = crops.shape[:3]
+
+    # Пачка как одно «высокое» изображение: для попиксельных cvtColor результат тот же
+    tall = crops.reshape(n * h, w, 3)
+    hsv = cv2.cvtColor(tall, cv2.COLOR_RGB2HSV).reshape(n, h, w, 3)
+    gray = cv2.cvtColor(tall, cv2.COLOR_RGB2GRAY).reshape(n, h, w)
+
+    # Маска фигуры: размытие, адаптивный порог и наибольший контур (по каждому кропу)
+    masks = np.zeros((n, h, w), dtype=np.uint8)
+    for i in range(n):
+        blur = cv2.GaussianBlur(gray[i], (5, 5), 0)
+        thresh = cv2.adaptiveThreshold(blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY_INV, 11, 2)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            # Берем самый большой контур
+            main_contour = max(contours, key=cv2.contourArea)
+            cv2.drawContours(masks[i], [main_contour], -1, 1, -1)
+
+    # Средние по маске для всей пачки
+    saturation = hsv[..., 1].astype(np.float32)
+    value = hsv[..., 2].astype(np.float32)
+    counts = masks.sum(axis=(1, 2), dtype=np.float32)
+    safe_counts = np.maximum(counts, 1)
+    mean_value = (value * masks).sum(axis=(1, 2)) / safe_counts
+    mean_saturation = (saturation * masks).sum(axis=(1, 2)) / safe_counts
+    dark_ratio = ((value < 127) & (masks > 0)).sum(axis=(1, 2)) / safe_counts
+
+    # Правило как в ChessClassifierApp.detect_color
+    labels = np.where(
+        mean_value < 100, BLACK,
+        np.where((mean_value > 150) & (mean_saturation < 50), WHITE,
+                 np.where(dark_ratio > 0.6, BLACK, WHITE))
+    ).astype(object)
+    labels[counts == 0] = UNKNOWN
+    mean_value[counts == 0] = 0
+    return labels, mean_value
+
+def detect_colors_batch(images, crop_size=COLOR_CROP_SIZE):
+    """
+    Пакетное определение цвета для уже декодированных изображений (массивы или PIL.Image)
+    """
+    crops = [extract_color_crop(image, crop_size) for image in images]
+    if not crops:
+        return detect_colors_from_crops([])
+    return detect_colors_from_crops(np.stack(crops))
@@ -0,0 +1,53 @@
+import os
+import hashlib
+from chess_inference import CLASS_LABELS
+
+# Классы в порядке выходов модели
+CLASSES = list(CLASS_LABELS)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+def list_classes(directory):
+    """
+    Подкаталоги классов по алфавиту (как при выводе классов в flow_from_directory)
+    """
+    return sorted(d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d)))
+
+def list_class_images(directory, classes=None):
+    """
+    Возвращает список (путь, индекс класса) в том же порядке, что и flow_from_directory:
+    классы по списку classes (или подкаталоги по алфавиту), файлы по алфавиту
+    """
+    if classes is None:
+        classes = list_classes(directory)
+
+    items = []
+    for class_idx, class_name in enumerate(classes):
+        class_dir = os.path.join(directory, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for root, _, files in sorted(os.walk(class_dir)):
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    items.append((os.path.join(root, file_name), class_idx))
+    return items
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    SHA-1 содержимого файла (ключ кэшей, не зависящий от имени и расположения)
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_class_name(name):
+    """
+    Имя класса без суффиксов исходных наборов ('Queen-Resized' -> 'queen');
+    неизвестные имена возвращаются в нижнем регистре
+    """
+    name = name.lower()
+    for class_name in CLASSES:
+        if name.startswith(class_name):
+            return class_name
+    return name
@@ -0,0 +1,300 @@
+import os
+import sys
+import csv
+import itertools
+import numpy as np
+from functools import lru_cache
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from chess_inference import DECODE_WORKERS
+from dataset_files import IMAGE_EXTENSIONS, file_hash, normalize_class_name
+
+# Индекс содержимого наборов: одна строка на файл
+INDEX_FILE = os.path.join('data', 'dataset_index.csv')
+INDEX_COLUMNS = ["path", "source", "split", "class", "size", "mtime", "sha1", "phash", "width", "height"]
+DEDUP_REPORT = os.path.join('results', 'dedup_report.csv')
+
+# Наборы конвейера: имя -> (каталог, роль). Роль "train"/"val" — на чём обучаемся и
+# на чём проверяемся, "source" — промежуточные копии, из которых собираются остальные
+DATASET_SOURCES = {
+    "raw": ('data/raw', "source"),
+    "normalized": ('data/normalized', "source"),
+    "kaggle": ('data/kaggle/dataset', "source"),
+    "enhanced": ('data/enhanced', "source"),
+    "merged": ('data/merged', "val"),
+    "augmented": ('data/augmented', "train"),
+    "augmented_train": ('data/augmented_train', "train"),
+    "balanced_train": ('data/balanced_train', "train"),
+    "balanced_train_augmented": ('data/balanced_train_augmented', "train"),
+    "val": ('data/val', "val"),
+    "balanced_val": ('data/balanced_val', "val"),
+}
+
+# Перцептивный хэш: DCT 32x32, младшие 8x8 частот -> 64 бита
+PHASH_SIZE = 32
+PHASH_LOW = 8
+# Порог расстояния Хэмминга для почти-дубликатов (пересжатие, ресайз, мелкие правки)
+PHASH_THRESHOLD = int(os.environ.get("CHESS_PHASH_THRESHOLD", 4))
+
+@lru_cache(maxsize=2)
+def _dct_matrix(n):
+    # Ортонормированная матрица DCT-II
+    k = np.arange(n)[:, np.newaxis]
+    x = np.arange(n)[np.newaxis, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+def perceptual_hash(image):
+    """
+    pHash изображения (PIL.Image) как 64-битное целое: биты — младшие частоты DCT
+    яркости выше медианы. Устойчив к пересжатию, ресайзу и небольшим изменениям цвета
+    """
+    gray = np.asarray(image.convert('L').resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(PHASH_SIZE)
+    low = (dct @ gray @ dct.T)[:PHASH_LOW, :PHASH_LOW].ravel()
+    # Постоянная составляющая не участвует в медиане
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+def hamming_distance(hashes, value):
+    """
+    Расстояния Хэмминга от value до каждого хэша массива uint64
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor).astype(np.int64)
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def scan_source(name, directory, split):
+    """
+    Файлы набора: (путь, источник, роль, класс); класс — подкаталог
+    с нормализованным именем
+    """
+    entries = []
+    if not os.path.isdir(directory):
+        return entries
+    for class_dir in sorted(os.listdir(directory)):
+        class_path = os.path.join(directory, class_dir)
+        if not os.path.isdir(class_path):
+            continue
+        class_name = normalize_class_name(class_dir)
+        for root, _, files in sorted(os.walk(class_path)):
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    entries.append((os.path.join(root, file_name), name, split, class_name))
+    return entries
+
+def _hash_file(path):
+    with Image.open(path) as img:
+        width, height = img.size
+        phash = perceptual_hash(img)
+    return {"sha1": file_hash(path), "phash": f"{phash:016x}", "width": width, "height": height}
+
+def load_index(index_file=INDEX_FILE):
+    if not os.path.exists(index_file):
+        return []
+    with open(index_file, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+def save_index(rows, index_file=INDEX_FILE):
+    os.makedirs(os.path.dirname(index_file) or '.', exist_ok=True)
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_file, index_file)
+
+def build_index(sources=None, index_file=INDEX_FILE, workers=DECODE_WORKERS):
+    """
+    Строит (или обновляет) индекс наборов. Файлы с прежними размером и временем
+    изменения берутся из старого индекса, остальные хэшируются заново параллельно
+    """
+    if sources is None:
+        sources = DATASET_SOURCES
+    previous = {row["path"]: row for row in load_index(index_file)}
+
+    rows, pending = [], []
+    for name, (directory, split) in sources.items():
+        for path, source, split, class_name in scan_source(name, directory, split):
+            stat = os.stat(path)
+            row = {"path": path, "source": source, "split": split, "class": class_name,
+                   "size": str(stat.st_size), "mtime": f"{stat.st_mtime:.6f}"}
+            old = previous.get(path)
+            if old and old["size"] == row["size"] and old["mtime"] == row["mtime"]:
+                row.update({key: old[key] for key in ("sha1", "phash", "width", "height")})
+            else:
+                pending.append(row)
+            rows.append(row)
+
+    if pending:
+        print(f"Хэширование {len(pending)} из {len(rows)} файлов...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for row, hashes in zip(pending, pool.map(_hash_file, (row["path"] for row in pending))):
+                row.update({key: str(value) for key, value in hashes.items()})
+
+    save_index(rows, index_file)
+    print(f"Индекс: {len(rows)} файлов, {len({row['sha1'] for row in rows})} уникальных -> {index_file}")
+    return rows
+
+def exact_duplicates(rows):
+    """
+    Группы строк с одинаковым содержимым (sha1), только группы из 2+ файлов
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(row["sha1"], []).append(row)
+    return {sha1: group for sha1, group in groups.items() if len(group) > 1}
+
+def near_duplicates(rows, threshold=PHASH_THRESHOLD):
+    """
+    Пары различного содержимого с расстоянием pHash <= threshold: [(sha1_a, sha1_b, d)].
+    Хэш делится на threshold + 1 полос: у близких хэшей хотя бы одна полоса совпадает,
+    поэтому сравниваются только хэши из общих корзин, а не все пары
+    """
+    unique = {}
+    for row in rows:
+        unique.setdefault(row["sha1"], int(row["phash"], 16))
+    keys = list(unique)
+    hashes = np.array([unique[key] for key in keys], dtype=np.uint64)
+
+    bands = threshold + 1
+    bounds = np.linspace(0, 64, bands + 1).astype(int)
+    pairs = {}
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        band = (hashes >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+        order = np.argsort(band, kind='stable')
+        starts = np.flatnonzero(np.diff(band[order])) + 1
+        for bucket in np.split(order, starts):
+            if len(bucket) < 2:
+                continue
+            bucket = np.sort(bucket)
+            for pos in range(len(bucket) - 1):
+                i = bucket[pos]
+                others = bucket[pos + 1:]
+                distances = hamming_distance(hashes[others], hashes[i])
+                for j, distance in zip(others[distances <= threshold], distances[distances <= threshold]):
+                    pairs[(i, j)] = int(distance)
+    return [(keys[i], keys[j], distance) for (i, j), distance in sorted(pairs.items())]
+
+def find_duplicates(rows, threshold=PHASH_THRESHOLD):
+    """
+    Все пары-дубликаты строк индекса: точные (sha1) и почти-дубликаты (pHash).
+    Для каждой пары отмечаются утечка train/val и расхождение классов
+    """
+    by_sha1 = {}
+    for row in rows:
+        by_sha1.setdefault(row["sha1"], []).append(row)
+
+    pairs = []
+    for group in exact_duplicates(rows).values():
+        for a, b in itertools.combinations(group, 2):
+            pairs.append(("exact", 0, a, b))
+    for sha1_a, sha1_b, distance in near_duplicates(rows, threshold):
+        for a in by_sha1[sha1_a]:
+            for b in by_sha1[sha1_b]:
+                pairs.append(("near", distance, a, b))
+
+    report = []
+    for kind, distance, a, b in pairs:
+        report.append({
+            "kind": kind,
+            "distance": distance,
+            "leak": {a["split"], b["split"]} == {"train", "val"},
+            "class_conflict": a["class"] != b["class"],
+            "a": a,
+            "b": b,
+        })
+    return report
+
+def save_report(report, report_file=DEDUP_REPORT):
+    os.makedirs(os.path.dirname(report_file) or '.', exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["kind", "distance", "leak", "class_conflict",
+                         "path_a", "source_a", "class_a", "path_b", "source_b", "class_b"])
+        for item in report:
+            a, b = item["a"], item["b"]
+            writer.writerow([item["kind"], item["distance"], int(item["leak"]), int(item["class_conflict"]),
+                             a["path"], a["source"], a["class"], b["path"], b["source"], b["class"]])
+
+def redundant_copies(rows):
+    """
+    Лишние точные копии внутри одного набора (оставляется первый путь по алфавиту)
+    и файлы обучающих наборов, совпадающие с проверочными
+    """
+    redundant = {}
+    for group in exact_duplicates(rows).values():
+        by_source = {}
+        for row in sorted(group, key=lambda row: row["path"]):
+            by_source.setdefault(row["source"], []).append(row)
+        for copies in by_source.values():
+            for row in copies[1:]:
+                redundant[row["path"]] = row
+        if any(row["split"] == "val" for row in group):
+            for row in group:
+                if row["split"] == "train":
+                    redundant[row["path"]] = row
+    return list(redundant.values())
+
+def remove_duplicates(rows, index_file=INDEX_FILE):
+    """
+    Удаляет лишние точные копии (см. redundant_copies) и обновляет индекс.
+    Почти-дубликаты только попадают в отчёт: их нужно просматривать вручную
+    """
+    redundant = redundant_copies(rows)
+    removed = set()
+    freed = 0
+    for row in redundant:
+        try:
+            stat = os.stat(row["path"])
+            os.remove(row["path"])
+        except OSError as e:
+            print(f"Ошибка при удалении {row['path']}: {str(e)}")
+            continue
+        removed.add(row["path"])
+        # Жёсткая ссылка (materialize) освобождает место, только если это было последнее имя файла
+        if stat.st_nlink == 1:
+            freed += stat.st_size
+    print(f"Удалено файлов: {len(removed)}, освобождено {freed / 2**20:.1f} МБ")
+
+    rows = [row for row in rows if row["path"] not in removed]
+    save_index(rows, index_file)
+    return rows
+
+def print_summary(rows, report):
+    total_bytes = sum(int(row["size"]) for row in rows)
+    unique = {}
+    for row in rows:
+        unique.setdefault(row["sha1"], int(row["size"]))
+    unique_bytes = sum(unique.values())
+
+    print("\nНаборы:")
+    sources = {}
+    for row in rows:
+        sources[row["source"]] = sources.get(row["source"], 0) + 1
+    for source, count in sources.items():
+        print(f"  {source} ({DATASET_SOURCES.get(source, ('', ''))[1]}): {count}")
+
+    print(f"\nФайлов: {len(rows)}, уникального содержимого: {len(unique)}")
+    print(f"Повторно хранится: {(total_bytes - unique_bytes) / 2**20:.1f} МБ из {total_bytes / 2**20:.1f} МБ")
+    for kind, title in (("exact", "Точных дубликатов"), ("near", "Почти-дубликатов")):
+        items = [item for item in report if item["kind"] == kind]
+        leaks = [item for item in items if item["leak"]]
+        conflicts = [item for item in items if item["class_conflict"]]
+        print(f"{title}: {len(items)} пар, утечек train/val: {len(leaks)}, с разными классами: {len(conflicts)}")
+
+def main():
+    remove = '--remove' in sys.argv[1:]
+    rows = build_index()
+    report = find_duplicates(rows)
+    save_report(report)
+    print_summary(rows, report)
+    print(f"Отчёт: {DEDUP_REPORT}")
+
+    if remove:
+        rows = remove_duplicates(rows)
+
+if __name__ == "__main__":
+    main()
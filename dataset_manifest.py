@@ -0,0 +1,175 @@
+import os
+import sys
+import csv
+import json
+import random
+import hashlib
+from dataset_files import IMAGE_EXTENSIONS, list_class_images, list_classes, normalize_class_name
+
+# Манифест набора: CSV со строкой на изображение. Новый сплит или ограничение
+# на класс — новый манифест поверх тех же файлов, без копирования
+MANIFEST_DIR = os.path.join('data', 'manifests')
+MANIFEST_COLUMNS = ["path", "label", "split", "source", "augmentation"]
+# Манифест для обучения: сплиты "train" и "val" вместо каталогов (CHESS_DATASET_MANIFEST)
+DATASET_MANIFEST = os.environ.get("CHESS_DATASET_MANIFEST")
+
+def manifest_path(name, manifest_dir=MANIFEST_DIR):
+    return os.path.join(manifest_dir, f"{name}.csv")
+
+def is_manifest(source):
+    return str(source).lower().endswith('.csv')
+
+def manifest_rows(directory, split, source=None, augmentation=None):
+    """
+    Строки манифеста для каталога классов. augmentation — словарь параметров для всех
+    файлов или функция имя_файла -> словарь/None
+    """
+    if source is None:
+        source = os.path.basename(os.path.normpath(directory))
+    rows = []
+    if not os.path.isdir(directory):
+        return rows
+    for class_dir in sorted(os.listdir(directory)):
+        class_path = os.path.join(directory, class_dir)
+        if not os.path.isdir(class_path):
+            continue
+        for file_name in sorted(os.listdir(class_path)):
+            if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            params = augmentation(file_name) if callable(augmentation) else augmentation
+            rows.append({
+                "path": os.path.join(class_path, file_name),
+                "label": normalize_class_name(class_dir),
+                "split": split,
+                "source": source,
+                "augmentation": params,
+            })
+    return rows
+
+def write_manifest(rows, path):
+    """
+    Записывает манифест атомарно; параметры аугментации хранятся как JSON
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            params = row.get("augmentation")
+            writer.writerow({**row, "augmentation": json.dumps(params, sort_keys=True) if params else ""})
+    os.replace(tmp_path, path)
+    print(f"Манифест: {len(rows)} изображений -> {path}")
+    return path
+
+def read_manifest(path, split=None):
+    """
+    Строки манифеста (все или одного сплита); пути относительно каталога запуска
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        row["augmentation"] = json.loads(row["augmentation"]) if row["augmentation"] else None
+    if split is not None:
+        rows = [row for row in rows if row["split"] == split]
+    return rows
+
+def cap_per_class(rows, max_per_class, seed=None):
+    """
+    Случайные не более max_per_class строк каждого класса (как balance_class),
+    порядок результата — по классу и пути
+    """
+    rng = random.Random(seed)
+    by_label = {}
+    for row in rows:
+        by_label.setdefault(row["label"], []).append(row)
+    selected = []
+    for label in sorted(by_label):
+        class_rows = sorted(by_label[label], key=lambda row: row["path"])
+        rng.shuffle(class_rows)
+        selected.extend(class_rows[:max_per_class])
+    return sorted(selected, key=lambda row: (row["label"], row["path"]))
+
+def with_split(rows, split):
+    return [{**row, "split": split} for row in rows]
+
+def split_rows(rows, val_fraction, seed=None):
+    """
+    Стратифицированное разбиение на train/val: доля val_fraction каждого класса уходит в val
+    """
+    rng = random.Random(seed)
+    by_label = {}
+    for row in rows:
+        by_label.setdefault(row["label"], []).append(row)
+    result = []
+    for label in sorted(by_label):
+        class_rows = sorted(by_label[label], key=lambda row: row["path"])
+        rng.shuffle(class_rows)
+        val_count = int(round(len(class_rows) * val_fraction))
+        result.extend(with_split(class_rows[:val_count], "val"))
+        result.extend(with_split(class_rows[val_count:], "train"))
+    return sorted(result, key=lambda row: (row["split"], row["label"], row["path"]))
+
+def dataset_classes(source, split=None):
+    """
+    Классы каталога (подкаталоги по алфавиту) или манифеста (метки по алфавиту)
+    """
+    if is_manifest(source):
+        return sorted({row["label"] for row in read_manifest(source, split)})
+    return list_classes(source)
+
+def dataset_items(source, classes=None, split=None):
+    """
+    Список (путь, индекс класса) из каталога или из сплита манифеста;
+    порядок тот же, что у flow_from_directory: по классам, внутри — по пути
+    """
+    if not is_manifest(source):
+        return list_class_images(source, classes)
+    if classes is None:
+        classes = dataset_classes(source, split)
+    class_index = {class_name: idx for idx, class_name in enumerate(classes)}
+    rows = [row for row in read_manifest(source, split) if row["label"] in class_index]
+    rows.sort(key=lambda row: (class_index[row["label"]], row["path"]))
+    return [(row["path"], class_index[row["label"]]) for row in rows]
+
+def flow_from_source(datagen, source, split=None, **kwargs):
+    """
+    ImageDataGenerator: flow_from_directory для каталога или flow_from_dataframe
+    для сплита манифеста; остальные аргументы передаются как есть
+    """
+    if not is_manifest(source):
+        return datagen.flow_from_directory(source, **kwargs)
+    import pandas as pd
+    rows = read_manifest(source, split)
+    frame = pd.DataFrame({"filename": [row["path"] for row in rows], "class": [row["label"] for row in rows]})
+    return datagen.flow_from_dataframe(frame, x_col="filename", y_col="class", **kwargs)
+
+def items_hash(items):
+    """
+    Отпечаток состава набора (пути и метки) — для проверки производных кэшей
+    """
+    digest = hashlib.sha1()
+    for path, label in items:
+        digest.update(f"{path}\t{label}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def main():
+    """
+    Новый сплит без копирования файлов:
+    python dataset_manifest.py <каталог или манифест> <выходной манифест> [доля val] [максимум на класс]
+    """
+    if len(sys.argv) < 3:
+        print(main.__doc__)
+        return
+    source, output = sys.argv[1], sys.argv[2]
+    val_fraction = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    max_per_class = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    rows = read_manifest(source) if is_manifest(source) else manifest_rows(source, "all")
+    if max_per_class:
+        rows = cap_per_class(rows, max_per_class, seed=42)
+    rows = split_rows(rows, val_fraction, seed=42)
+    write_manifest(rows, output)
+
+if __name__ == "__main__":
+    main()
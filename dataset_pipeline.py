@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import sqlite3
+import threading
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from tqdm import tqdm
+from augmentation import AUGMENT_DATASET_PARAMS, ENHANCE_DATASET_PARAMS, MERGE_AUGMENTATION_PARAMS
+from batch_augment import augment_files, output_stem
+from chess_inference import IMG_SIZE
+from dataset_files import CLASSES, file_hash, list_class_images
+from dataset_index import scan_source
+from dataset_manifest import items_hash, manifest_path, manifest_rows, write_manifest
+from materialize import link_file
+
+# Состояние конвейера: для каждого входного файла этапа — размер, время изменения,
+# SHA-1, параметры и созданные файлы. Пишется после каждого блока, поэтому
+# прерванный запуск продолжается с места остановки
+PIPELINE_STATE = os.path.join('data', 'pipeline_state.db')
+PIPELINE_WORKERS = int(os.environ.get("CHESS_PIPELINE_WORKERS", os.cpu_count() or 1))
+# Файлов в одном блоке (единица работы процесса и фиксации состояния)
+PIPELINE_CHUNK = 32
+
+# Каталоги и параметры этапов (как в normalize_dataset, download_and_merge_datasets,
+# enhance_dataset, balance_dataset и augment_dataset)
+RAW_DIR = 'data/raw'
+NORMALIZED_DIR = 'data/normalized'
+MERGE_SOURCES = {"kaggle": 'data/kaggle/dataset', "normalized": NORMALIZED_DIR}
+MERGED_DIR = 'data/merged'
+MERGE_TARGET = 1000
+ENHANCED_DIR = 'data/enhanced'
+ENHANCE_TARGET = 200
+# Не больше 5 аугментаций на исходное изображение (как при объединении и в enhance_dataset)
+MAX_AUGMENTATIONS_PER_IMAGE = 5
+BALANCE_SPLITS = {
+    "train": ('data/augmented_train', 'data/balanced_train', 5000),
+    "val": ('data/val', 'data/balanced_val', 200),
+}
+BALANCE_SEED = 42
+AUGMENT_INPUT_DIR = 'data/balanced_train'
+AUGMENTED_DIR = 'data/balanced_train_augmented'
+AUGMENT_TARGET = 1000
+
+class PipelineState:
+    """
+    Состояние этапов в SQLite; одно соединение на все потоки (под блокировкой)
+    """
+
+    def __init__(self, path=PIPELINE_STATE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS units (
+                    stage TEXT, input TEXT, size INTEGER, mtime REAL, sha1 TEXT,
+                    params TEXT, outputs TEXT, PRIMARY KEY (stage, input)
+                )
+            """)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS stages (stage TEXT PRIMARY KEY, fingerprint TEXT)")
+
+    def load(self, stage):
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT input, size, mtime, sha1, params, outputs FROM units WHERE stage = ?", (stage,))
+            return {
+                row[0]: {"size": row[1], "mtime": row[2], "sha1": row[3], "params": row[4],
+                         "outputs": json.loads(row[5])}
+                for row in cursor
+            }
+
+    def save(self, stage, records):
+        """
+        records: [(вход, size, mtime, sha1, params, outputs)]
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(stage, path, size, mtime, sha1, params, json.dumps(outputs))
+                 for path, size, mtime, sha1, params, outputs in records]
+            )
+
+    def delete(self, stage, inputs):
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM units WHERE stage = ? AND input = ?",
+                                  [(stage, path) for path in inputs])
+
+    def fingerprint(self, stage):
+        with self._lock:
+            row = self.conn.execute("SELECT fingerprint FROM stages WHERE stage = ?", (stage,)).fetchone()
+            return row[0] if row else None
+
+    def set_fingerprint(self, stage, fingerprint):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO stages VALUES (?, ?)", (stage, fingerprint))
+
+def augmentations_needed(count, target, max_per_image=None):
+    """
+    Аугментаций на изображение, чтобы класс из count файлов достиг target (как в augment_class)
+    """
+    if count == 0 or count >= target:
+        return 0
+    needed = (target - count) // count + 1
+    return min(needed, max_per_image) if max_per_image else needed
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+# Обработчики блоков. Выполняются в процессах пула: получают список задач (первый
+# элемент задачи — входной файл) и возвращают для каждой список созданных файлов
+
+def _link_units(tasks):
+    outputs = []
+    for src, dst in tasks:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        link_file(src, dst)
+        outputs.append([dst])
+    return outputs
+
+def _augment_units(tasks):
+    # Задача: (вход, каталог результата, класс, число аугментаций, параметры, префикс, расширение)
+    _, _, _, _, params, prefix, extension = tasks[0]
+    originals = []
+    for src, output_dir, _, _, _, _, _ in tasks:
+        os.makedirs(output_dir, exist_ok=True)
+        dst = os.path.join(output_dir, os.path.basename(src))
+        link_file(src, dst)
+        originals.append(dst)
+    augmented = augment_files([task[:4] for task in tasks], params, prefix=prefix, extension=extension)
+    outputs = []
+    for original, paths in zip(originals, augmented):
+        if paths is None:
+            # Нечитаемый файл не останавливает блок: его ссылка убирается, результатов нет
+            os.remove(original)
+            outputs.append([])
+        else:
+            outputs.append([original] + paths)
+    return outputs
+
+def merge_image(src, output_dir, source_name):
+    """
+    Нормализованная копия изображения для объединенного набора (RGB, 224x224, JPEG):
+    <источник>_<имя>_<расширение>.jpg — имена из разных источников и файлов
+    с одинаковым именем, но разным расширением не совпадают
+    """
+    output_path = os.path.join(output_dir, f'{source_name}_{output_stem(src)}.jpg')
+    with Image.open(src) as img:
+        img.convert('RGB').resize((IMG_SIZE, IMG_SIZE), Image.LANCZOS).save(output_path, quality=95, optimize=True)
+    return output_path
+
+def merge_files(tasks):
+    """
+    Нормализованные копии и аугментации для объединенного набора (этап merge
+    и download_and_merge_datasets). Задача: (вход, каталог результата, класс,
+    число аугментаций, параметры, источник). Возвращает для каждой задачи список
+    созданных файлов; для нечитаемого входа — пустой список
+    """
+    params = tasks[0][4]
+    items, merged = [], []
+    for src, output_dir, class_name, count, _, source_name in tasks:
+        os.makedirs(output_dir, exist_ok=True)
+        try:
+            items.append((merge_image(src, output_dir, source_name), output_dir, class_name, count))
+            merged.append(True)
+        except (OSError, ValueError) as e:
+            # Повреждённый файл не останавливает блок: у него просто нет результатов
+            print(f"Ошибка при обработке {src}: {str(e)}")
+            merged.append(False)
+    augmented = augment_files(items, params, extension='jpg')
+    outputs, position = [], 0
+    for ok in merged:
+        if ok:
+            outputs.append([items[position][0]] + augmented[position])
+            position += 1
+        else:
+            outputs.append([])
+    return outputs
+
+def _run_chunk(args):
+    worker, tasks = args
+    hashes = [file_hash(task[0]) for task in tasks]
+    outputs = worker(tasks)
+    return [(task[0], sha1, paths) for task, sha1, paths in zip(tasks, hashes, outputs)]
+
+def run_units(state, stage, units, worker, workers=PIPELINE_WORKERS, force=False):
+    """
+    Инкрементально выполняет этап над файлами. units: [(вход, параметры, задача)].
+    Файл пропускается, если его содержимое (размер и mtime, при расхождении — SHA-1)
+    и параметры не изменились, а результаты на месте. Результаты исчезнувших входов удаляются.
+    Возвращает (обработано, пропущено, удалено)
+    """
+    previous = state.load(stage)
+    pending, touched, seen = [], [], set()
+    meta = {}
+    for input_path, params, task in units:
+        seen.add(input_path)
+        stat = os.stat(input_path)
+        params_key = json.dumps(params, sort_keys=True)
+        old = previous.get(input_path)
+        if not force and old and old["params"] == params_key and all(os.path.exists(p) for p in old["outputs"]):
+            if old["size"] == stat.st_size and old["mtime"] == stat.st_mtime:
+                continue
+            # Файл тронут, но содержимое то же (например, скопирован заново)
+            sha1 = file_hash(input_path)
+            if sha1 == old["sha1"]:
+                touched.append((input_path, stat.st_size, stat.st_mtime, sha1, params_key, old["outputs"]))
+                continue
+        meta[input_path] = (stat.st_size, stat.st_mtime, params_key)
+        pending.append(task)
+    state.save(stage, touched)
+
+    removed = [path for path in previous if path not in seen]
+    for path in removed:
+        _remove_files(previous[path]["outputs"])
+    state.delete(stage, removed)
+
+    skipped = len(seen) - len(pending)
+    chunks = [(worker, pending[i:i + PIPELINE_CHUNK]) for i in range(0, len(pending), PIPELINE_CHUNK)]
+
+    def record(results):
+        records = []
+        for input_path, sha1, outputs in results:
+            old = previous.get(input_path)
+            if old:
+                # Файлы прежнего запуска, которых нет в новом результате
+                _remove_files(set(old["outputs"]) - set(outputs))
+            size, mtime, params_key = meta[input_path]
+            records.append((input_path, size, mtime, sha1, params_key, outputs))
+        state.save(stage, records)
+        progress.update(len(results))
+
+    with tqdm(total=len(pending), desc=stage) as progress:
+        if workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                record(_run_chunk(chunk))
+        else:
+            # spawn: этапы идут в потоках, fork из многопоточного процесса небезопасен
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(processes=min(workers, len(chunks))) as pool:
+                for results in pool.imap_unordered(_run_chunk, chunks):
+                    record(results)
+
+    print(f"{stage}: обработано {len(pending)}, без изменений {skipped}, удалено {len(removed)}")
+    return len(pending), skipped, len(removed)
+
+def _class_units(source_name, directory, target, max_per_image, task_for):
+    """
+    Задачи аугментирующего этапа: число аугментаций считается по размеру класса
+    и входит в параметры, поэтому при изменении класса его файлы пересобираются
+    """
+    entries = [entry for entry in scan_source(source_name, directory, "source") if entry[3] in CLASSES]
+    counts = Counter(class_name for _, _, _, class_name in entries)
+    return [task_for(path, class_name, augmentations_needed(counts[class_name], target, max_per_image))
+            for path, _, _, class_name in entries]
+
+def normalize_stage(state, workers=PIPELINE_WORKERS, force=False):
+    """
+    data/raw -> data/normalized: нормализованные имена классов, файлы — ссылками
+    """
+    units = []
+    for path, _, _, class_name in scan_source("raw", RAW_DIR, "source"):
+        if class_name in CLASSES:
+            dst = os.path.join(NORMALIZED_DIR, class_name, os.path.basename(path))
+            units.append((path, {}, (path, dst)))
+    run_units(state, "normalize", units, _link_units, workers, force)
+    write_manifest(manifest_rows(NORMALIZED_DIR, "all", source="normalized"), manifest_path('normalized'))
+
+def merge_stage(state, workers=PIPELINE_WORKERS, force=False):
+    """
+    Kaggle + data/normalized -> data/merged: нормализованные копии и аугментации
+    """
+    entries = [
+        (path, source_name, class_name)
+        for source_name, directory in MERGE_SOURCES.items()
+        for path, _, _, class_name in scan_source(source_name, directory, "source")
+        if class_name in CLASSES
+    ]
+    # Цель по классу считается по всем источникам вместе
+    totals = Counter(class_name for _, _, class_name in entries)
+    units = []
+    for path, source_name, class_name in entries:
+        count = augmentations_needed(totals[class_name], MERGE_TARGET, MAX_AUGMENTATIONS_PER_IMAGE)
+        params = {"augmentation": MERGE_AUGMENTATION_PARAMS, "count": count, "size": IMG_SIZE}
+        task = (path, os.path.join(MERGED_DIR, class_name), class_name, count, MERGE_AUGMENTATION_PARAMS, source_name)
+        units.append((path, params, task))
+    run_units(state, "merge", units, merge_files, workers, force)
+    write_manifest(
+        manifest_rows(MERGED_DIR, "all", source="merged",
+                      augmentation=lambda name: MERGE_AUGMENTATION_PARAMS if name.startswith('aug_') else None),
+        manifest_path('merged')
+    )
+
+def _augment_stage(state, stage, input_dir, output_dir, target, max_per_image, params, prefix, extension,
+                   workers, force):
+    def task_for(path, class_name, count):
+        task = (path, os.path.join(output_dir, class_name), class_name, count, params, prefix(class_name), extension)
+        return path, {"augmentation": params, "count": count, "prefix": task[5], "extension": extension}, task
+
+    units = _class_units(stage, input_dir, target, max_per_image, task_for)
+    run_units(state, stage, units, _augment_units, workers, force)
+
+def enhance_stage(state, workers=PIPELINE_WORKERS, force=False):
+    """
+    data/normalized -> data/enhanced: расширенная аугментация до ENHANCE_TARGET на класс
+    """
+    _augment_stage(state, "enhance", NORMALIZED_DIR, ENHANCED_DIR, ENHANCE_TARGET, MAX_AUGMENTATIONS_PER_IMAGE,
+                   ENHANCE_DATASET_PARAMS, lambda class_name: f'{class_name}_aug_', 'jpg', workers, force)
+    write_manifest(
+        manifest_rows(ENHANCED_DIR, "all", augmentation=lambda name: ENHANCE_DATASET_PARAMS if '_aug_' in name else None),
+        manifest_path('enhanced')
+    )
+
+def augment_stage(state, workers=PIPELINE_WORKERS, force=False):
+    """
+    data/balanced_train -> data/balanced_train_augmented (как augment_dataset.py)
+    """
+    _augment_stage(state, "augment", AUGMENT_INPUT_DIR, AUGMENTED_DIR, AUGMENT_TARGET, None,
+                   AUGMENT_DATASET_PARAMS, lambda class_name: 'aug_', 'png', workers, force)
+    write_manifest(
+        manifest_rows(AUGMENTED_DIR, "train", augmentation=lambda name: AUGMENT_DATASET_PARAMS if name.startswith('aug_') else None),
+        manifest_path(os.path.basename(AUGMENTED_DIR))
+    )
+
+def balance_stage(state, workers=PIPELINE_WORKERS, force=False):
+    """
+    Сбалансированные сплиты: отбор — операция над метаданными, поэтому этап
+    пропускается целиком, если состав входных каталогов и параметры не изменились
+    """
+    from balance_dataset import BALANCED_MANIFEST, balance_class
+
+    fingerprint = items_hash(
+        [(json.dumps(BALANCE_SPLITS, sort_keys=True), BALANCE_SEED)] +
+        [item for input_dir, _, _ in BALANCE_SPLITS.values() for item in list_class_images(input_dir)]
+    )
+    outputs_ready = all(os.path.isdir(output_dir) for _, output_dir, _ in BALANCE_SPLITS.values())
+    if not force and outputs_ready and state.fingerprint("balance") == fingerprint:
+        print("balance: без изменений")
+        return
+
+    rows = []
+    for split, (input_dir, output_dir, max_per_class) in BALANCE_SPLITS.items():
+        split_rows = balance_class(input_dir, output_dir, max_per_class, split=split, seed=BALANCE_SEED)
+        # Файлы прошлого отбора, не вошедшие в новый
+        selected = {os.path.join(output_dir, row["label"], os.path.basename(row["path"])) for row in split_rows}
+        for path, _ in list_class_images(output_dir):
+            if path not in selected:
+                os.remove(path)
+        rows.extend(split_rows)
+    write_manifest(rows, BALANCED_MANIFEST)
+    state.set_fingerprint("balance", fingerprint)
+
+# Этапы и их зависимости; независимые этапы выполняются параллельно
+PIPELINE_STAGES = {
+    "normalize": (normalize_stage, []),
+    "merge": (merge_stage, ["normalize"]),
+    "enhance": (enhance_stage, ["normalize"]),
+    "balance": (balance_stage, []),
+    "augment": (augment_stage, ["balance"]),
+}
+
+def run_pipeline(stages=None, workers=PIPELINE_WORKERS, force=False, state_file=PIPELINE_STATE):
+    """
+    Выполняет выбранные этапы (по умолчанию все) волнами: в волне — этапы, чьи
+    выбранные зависимости уже выполнены; процессы делятся между этапами волны
+    """
+    selected = [stage for stage in PIPELINE_STAGES if stages is None or stage in stages]
+    state = PipelineState(state_file)
+    done = set()
+    remaining = list(selected)
+    while remaining:
+        ready = [stage for stage in remaining
+                 if all(dep in done or dep not in selected for dep in PIPELINE_STAGES[stage][1])]
+        stage_workers = max(1, workers // len(ready))
+        print(f"\nЭтапы: {', '.join(ready)}")
+        with ThreadPoolExecutor(max_workers=len(ready)) as pool:
+            futures = {stage: pool.submit(PIPELINE_STAGES[stage][0], state, stage_workers, force) for stage in ready}
+            for stage, future in futures.items():
+                future.result()
+                done.add(stage)
+        remaining = [stage for stage in remaining if stage not in done]
+
+def main():
+    args = sys.argv[1:]
+    force = '--force' in args
+    stages = [arg for arg in args if not arg.startswith('--')]
+    unknown = [stage for stage in stages if stage not in PIPELINE_STAGES]
+    if unknown:
+        print(f"Неизвестные этапы: {', '.join(unknown)}; доступны: {', '.join(PIPELINE_STAGES)}")
+        return
+    run_pipeline(stages or None, force=force)
+
+if __name__ == "__main__":
+    main()
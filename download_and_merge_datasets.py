@@ -4,17 +4,22 @@ import requests
 import zipfile
 import kaggle
 from pathlib import Path
-import numpy as np
 from PIL import Image
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import matplotlib.pyplot as plt
 from tqdm import tqdm
 import concurrent.futures
 import multiprocessing
+from collections import Counter
+from augmentation import MERGE_AUGMENTATION_PARAMS
+from dataset_files import CLASSES
+from dataset_index import scan_source
+from dataset_manifest import manifest_path, write_manifest
+from dataset_pipeline import MAX_AUGMENTATIONS_PER_IMAGE, MERGE_SOURCES, augmentations_needed, merge_files
 
 # Устанавливаем количество процессов равным количеству ядер
 NUM_PROCESSES = multiprocessing.cpu_count()
+# Файлов в одной задаче пула: процессы получают пути, а не изображения
+MERGE_CHUNK = 32
 
 def download_kaggle_dataset():
     """
@@ -61,116 +66,72 @@ def download_uci_dataset():
     with zipfile.ZipFile('data/uci.zip', 'r') as zip_ref:
         zip_ref.extractall('data/uci')
 
-def normalize_image(img_path, target_size=(224, 224)):
+def merge_chunk(tasks):
     """
-    Нормализует изображение: изменяет размер, конвертирует в RGB
+    Обрабатывает блок файлов в процессе пула. Получает только пути и параметры,
+    сам пишет результаты и возвращает лёгкие метаданные: [(вход, созданные файлы)]
     """
-    try:
-        img = Image.open(img_path)
-        img = img.convert('RGB')
-        img = img.resize(target_size, Image.LANCZOS)
-        return img
-    except Exception as e:
-        print(f"Ошибка при обработке {img_path}: {str(e)}")
-        return None
-
-def process_image_batch(args):
-    """
-    Обрабатывает пакет изображений параллельно
-    """
-    img_paths, output_dir, class_name, datagen, target_count = args
-    processed_images = []
-    
-    for img_path in img_paths:
-        normalized_img = normalize_image(img_path)
-        if normalized_img is not None:
-            processed_images.append(normalized_img)
-            
-            # Сохраняем оригинальное изображение
-            output_path = os.path.join(output_dir, f'original_{len(processed_images):04d}.jpg')
-            normalized_img.save(output_path, quality=95, optimize=True)
-            
-            # Аугментируем изображение
-            if len(processed_images) < target_count:
-                img_array = np.array(normalized_img)
-                img_array = img_array.reshape((1,) + img_array.shape)
-                
-                i = 0
-                for batch in datagen.flow(img_array, 
-                                        batch_size=1,
-                                        save_to_dir=output_dir,
-                                        save_prefix=f'{class_name}_aug',
-                                        save_format='jpg'):
-                    i += 1
-                    if i >= 5 or len(processed_images) >= target_count:
-                        break
-    
-    return processed_images
+    return [(task[0], outputs) for task, outputs in zip(tasks, merge_files(tasks))]
 
 def merge_datasets(input_dirs, output_dir, target_count=1000):
     """
-    Объединяет данные из разных источников
+    Объединяет данные из разных источников. input_dirs — словарь источник -> каталог
+    (или список каталогов, источник — имя каталога). Каждый файл сохраняется как
+    <источник>_<имя>_<расширение>.jpg плюс аугментации этой копии, поэтому
+    процессы не пересекаются по именам. Возвращает [(вход, источник, класс, созданные файлы)]
     """
-    os.makedirs(output_dir, exist_ok=True)
-    
-    class_images = {
-        'bishop': [],
-        'knight': [],
-        'pawn': [],
-        'queen': [],
-        'rook': []
-    }
-    
-    # Создаем аугментатор с оптимизированными параметрами
-    datagen = ImageDataGenerator(
-        rotation_range=20,
-        width_shift_range=0.1,
-        height_shift_range=0.1,
-        shear_range=0.1,
-        zoom_range=0.1,
-        horizontal_flip=True,
-        fill_mode='nearest',
-        brightness_range=[0.8, 1.2]
-    )
-    
-    # Создаем пул процессов
-    with multiprocessing.Pool(processes=NUM_PROCESSES) as pool:
-        for input_dir in input_dirs:
-            for class_name in os.listdir(input_dir):
-                class_path = os.path.join(input_dir, class_name)
-                if not os.path.isdir(class_path):
-                    continue
-                    
-                normalized_class = class_name.lower().replace('-', '').replace('_', '')
-                if normalized_class not in class_images:
-                    continue
-                
-                class_dir = os.path.join(output_dir, normalized_class)
-                os.makedirs(class_dir, exist_ok=True)
-                
-                img_paths = [os.path.join(class_path, f) for f in os.listdir(class_path)
-                            if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-                
-                print(f"\nОбработка класса {normalized_class}:")
-                print(f"Найдено изображений: {len(img_paths)}")
-                
-                # Разбиваем на пакеты для параллельной обработки
-                batch_size = max(1, len(img_paths) // NUM_PROCESSES)
-                batches = [img_paths[i:i + batch_size] for i in range(0, len(img_paths), batch_size)]
-                
-                # Обрабатываем пакеты параллельно
-                args = [(batch, class_dir, normalized_class, datagen, target_count) 
-                        for batch in batches]
-                results = list(tqdm(pool.imap(process_image_batch, args), 
-                                  total=len(batches),
-                                  desc=f"Обработка {normalized_class}"))
-                
-                # Объединяем результаты
-                for batch_result in results:
-                    class_images[normalized_class].extend(batch_result)
-                
-                final_count = len(os.listdir(class_dir))
-                print(f"Финальное количество изображений: {final_count}")
+    if not isinstance(input_dirs, dict):
+        input_dirs = {os.path.basename(os.path.normpath(d)): d for d in input_dirs}
+
+    entries = [
+        (path, source_name, class_name)
+        for source_name, directory in input_dirs.items()
+        for path, _, _, class_name in scan_source(source_name, directory, "source")
+        if class_name in CLASSES
+    ]
+    # Цель по классу считается по всем источникам вместе
+    totals = Counter(class_name for _, _, class_name in entries)
+    tasks = []
+    for path, source_name, class_name in entries:
+        count = augmentations_needed(totals[class_name], target_count, MAX_AUGMENTATIONS_PER_IMAGE)
+        tasks.append((path, os.path.join(output_dir, class_name), class_name, count,
+                      MERGE_AUGMENTATION_PARAMS, source_name))
+    for class_name in sorted(totals):
+        print(f"Класс {class_name}: найдено изображений: {totals[class_name]}")
+
+    chunks = [tasks[i:i + MERGE_CHUNK] for i in range(0, len(tasks), MERGE_CHUNK)]
+    sources = {path: (source_name, class_name) for path, source_name, class_name in entries}
+    metadata = []
+    if chunks:
+        with multiprocessing.Pool(processes=min(NUM_PROCESSES, len(chunks))) as pool:
+            with tqdm(total=len(tasks), desc="Объединение") as progress:
+                for results in pool.imap_unordered(merge_chunk, chunks):
+                    metadata.extend((path, *sources[path], outputs) for path, outputs in results)
+                    progress.update(len(results))
+    metadata.sort()
+
+    failed = sum(1 for _, _, _, outputs in metadata if not outputs)
+    if failed:
+        print(f"Не удалось обработать файлов: {failed}")
+    counts = Counter()
+    rows = []
+    for _, source_name, class_name, outputs in metadata:
+        counts[class_name] += len(outputs)
+        for position, output in enumerate(outputs):
+            rows.append({
+                "path": output,
+                "label": class_name,
+                "split": "all",
+                "source": source_name,
+                # Первый результат — нормализованный оригинал, остальные — аугментации
+                "augmentation": MERGE_AUGMENTATION_PARAMS if position else None,
+            })
+    for class_name in sorted(counts):
+        print(f"Финальное количество изображений {class_name}: {counts[class_name]}")
+
+    # Манифест объединенного набора: оригиналы и аугментированные копии с параметрами
+    write_manifest(rows, manifest_path('merged'))
+    return metadata
 
 def verify_merged_dataset(directory):
     """
@@ -225,25 +186,6 @@ def verify_merged_dataset(directory):
     plt.close()
 
 def main():
-    # Включаем оптимизации TensorFlow
-    tf.config.optimizer.set_jit(True)
-    tf.config.optimizer.set_experimental_options({
-        'layout_optimizer': True,
-        'constant_folding': True,
-        'shape_optimization': True,
-        'remapping': True,
-        'arithmetic_optimization': True,
-        'dependency_optimization': True,
-        'loop_optimization': True,
-        'function_optimization': True,
-        'debug_stripper': True,
-        'disable_model_pruning': True,
-        'scoped_allocator_optimization': True,
-        'pin_to_host_optimization': True,
-        'implementation_selector': True,
-        'auto_mixed_precision': True
-    })
-    
     # Создаем директорию для данных
     os.makedirs('data', exist_ok=True)
     
@@ -256,12 +198,7 @@ def main():
     
     # Объединяем датасеты
     print("\nОбъединение датасетов...")
-    input_dirs = [
-        'data/kaggle/dataset',
-        'data/normalized'
-    ]
-    
-    merge_datasets(input_dirs, 'data/merged', target_count=1000)
+    merge_datasets(MERGE_SOURCES, 'data/merged', target_count=1000)
     
     # Проверяем результат
     print("\nПроверка объединенного датасета...")
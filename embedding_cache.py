@@ -0,0 +1,177 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from chess_inference import DECODE_WORKERS, IMG_SIZE, preprocess_image
+from dataset_files import file_hash
+from dataset_manifest import dataset_items
+
+# Кэш признаков замороженной базовой модели
+EMBEDDING_CACHE_DIR = os.path.join('cache', 'embeddings')
+# Сколько новых изображений считается и сохраняется в один шард
+SHARD_SIZE = 1024
+# Версия предобработки (rescale 1/255, ресайз nearest) — входит в ключ кэша
+PREPROCESS_VERSION = "rescale255_nearest"
+
+def backbone_key(backbone):
+    """
+    Ключ кэша: имя базовой модели, размер входа, предобработка и отпечаток весов
+    """
+    digest = hashlib.sha1()
+    for weights in backbone.get_weights():
+        digest.update(np.ascontiguousarray(weights).tobytes())
+    return f"{backbone.name}_{IMG_SIZE}_{PREPROCESS_VERSION}_{digest.hexdigest()[:12]}"
+
+class EmbeddingCache:
+    """
+    Хранилище эмбеддингов по хэшу содержимого файла: шарды .npy открываются через memmap,
+    индекс хэш -> (шард, строка) хранится в index.json. Новые эмбеддинги дописываются
+    новыми шардами, поэтому прерванный расчёт продолжается с места остановки.
+    """
+
+    def __init__(self, key, cache_dir=EMBEDDING_CACHE_DIR):
+        self.directory = os.path.join(cache_dir, key)
+        self.index_file = os.path.join(self.directory, 'index.json')
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = {}
+        self._shards = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def __contains__(self, content_hash):
+        return content_hash in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def missing(self, hashes):
+        """
+        Уникальные хэши, для которых эмбеддингов ещё нет (в исходном порядке)
+        """
+        return [h for h in dict.fromkeys(hashes) if h not in self.index]
+
+    def _shard(self, name):
+        if name not in self._shards:
+            self._shards[name] = np.load(os.path.join(self.directory, name), mmap_mode='r')
+        return self._shards[name]
+
+    def _write_atomic(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def add(self, hashes, embeddings):
+        """
+        Сохраняет пачку эмбеддингов новым шардом и обновляет индекс
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        shard_ids = [int(n[6:11]) for n in os.listdir(self.directory)
+                     if n.startswith('shard_') and n.endswith('.npy')]
+        name = f"shard_{max(shard_ids, default=-1) + 1:05d}.npy"
+        self._write_atomic(os.path.join(self.directory, name), lambda f: np.save(f, embeddings))
+
+        for row, content_hash in enumerate(hashes):
+            self.index[content_hash] = [name, row]
+        self._write_atomic(self.index_file,
+                           lambda f: f.write(json.dumps(self.index).encode('utf-8')))
+
+    def get(self, hashes):
+        """
+        Матрица эмбеддингов (N, D) в порядке hashes; чтение идёт по шардам
+        """
+        if not hashes:
+            return np.zeros((0, 0), dtype=np.float32)
+        locations = [self.index[h] for h in hashes]
+        first = self._shard(locations[0][0])
+        result = np.empty((len(hashes), first.shape[1]), dtype=np.float32)
+
+        by_shard = {}
+        for i, (name, row) in enumerate(locations):
+            by_shard.setdefault(name, ([], []))
+            by_shard[name][0].append(i)
+            by_shard[name][1].append(row)
+        for name, (positions, rows) in by_shard.items():
+            result[positions] = self._shard(name)[rows]
+        return result
+
+def feature_extractor(model):
+    """
+    Базовая модель + GlobalAveragePooling2D (первые два слоя модели обучения)
+    """
+    import tensorflow as tf
+    return tf.keras.Sequential(model.layers[:2])
+
+def build_head(model):
+    """
+    Голова классификатора поверх эмбеддингов. Слои общие с полной моделью,
+    поэтому обученные веса сразу оказываются в ней.
+    """
+    import tensorflow as tf
+    dim = model.layers[0].output.shape[-1]
+    return tf.keras.Sequential([tf.keras.Input(shape=(dim,))] + model.layers[2:])
+
+def cached_embeddings(model, paths, cache_dir=EMBEDDING_CACHE_DIR, batch_size=64):
+    """
+    Эмбеддинги для списка файлов: считаются только отсутствующие в кэше
+    """
+    with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+        hashes = list(pool.map(file_hash, paths))
+    cache = EmbeddingCache(backbone_key(model.layers[0]), cache_dir)
+
+    missing = cache.missing(hashes)
+    if missing:
+        print(f"Расчёт эмбеддингов: {len(missing)} из {len(set(hashes))} изображений (кэш {cache.directory})")
+        extractor = feature_extractor(model)
+        path_by_hash = dict(zip(hashes, paths))
+        with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+            for start in range(0, len(missing), SHARD_SIZE):
+                shard_hashes = missing[start:start + SHARD_SIZE]
+                # Декодирование в пуле потоков, инференс пакетами
+                x = np.stack(list(pool.map(preprocess_image, (path_by_hash[h] for h in shard_hashes))))
+                features = np.concatenate([
+                    np.asarray(extractor.predict_on_batch(x[i:i + batch_size]))
+                    for i in range(0, len(x), batch_size)
+                ])
+                cache.add(shard_hashes, features)
+                print(f"  {min(start + SHARD_SIZE, len(missing))}/{len(missing)}")
+    return cache.get(hashes)
+
+def train_head_on_cache(model, train_dir, val_dir, classes=None, epochs=20, batch_size=32,
+                        learning_rate=0.001, callbacks=None, cache_dir=EMBEDDING_CACHE_DIR,
+                        train_split="train", val_split="val"):
+    """
+    Фаза с замороженной базовой моделью: голова обучается на закэшированных эмбеддингах.
+    Онлайн-аугментация в этой фазе не применяется (признаки считаются по исходным файлам).
+    train_dir/val_dir — каталоги классов или манифест (тогда берутся сплиты train_split/val_split).
+    Возвращает History обучения головы.
+    """
+    import tensorflow as tf
+
+    train_items = dataset_items(train_dir, classes, train_split)
+    val_items = dataset_items(val_dir, classes, val_split)
+    num_classes = model.layers[-1].units
+
+    x_train = cached_embeddings(model, [path for path, _ in train_items], cache_dir)
+    y_train = tf.keras.utils.to_categorical([label for _, label in train_items], num_classes)
+    x_val = cached_embeddings(model, [path for path, _ in val_items], cache_dir)
+    y_val = tf.keras.utils.to_categorical([label for _, label in val_items], num_classes)
+
+    head = build_head(model)
+    head.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    return head.fit(
+        x_train, y_train,
+        validation_data=(x_val, y_val),
+        epochs=epochs,
+        batch_size=batch_size,
+        shuffle=True,
+        callbacks=callbacks,
+        verbose=1
+    )
@@ -1,29 +1,18 @@
 import os
-import shutil
 import numpy as np
 from PIL import Image
 import tensorflow as tf
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import matplotlib.pyplot as plt
 from pathlib import Path
+from materialize import describe, materialize_files
+from augmentation import ENHANCE_DATASET_PARAMS
 
 def create_enhanced_augmentation():
     """
     Создает генератор с расширенной аугментацией
     """
-    return ImageDataGenerator(
-        rotation_range=30,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        shear_range=0.2,
-        zoom_range=0.2,
-        horizontal_flip=True,
-        vertical_flip=True,
-        fill_mode='nearest',
-        brightness_range=[0.7, 1.3],
-        channel_shift_range=50.0,
-        validation_split=0.2
-    )
+    return ImageDataGenerator(fill_mode='nearest', validation_split=0.2, **ENHANCE_DATASET_PARAMS)
 
 def augment_images(input_dir, output_dir, target_count=200):
     """
@@ -53,11 +42,11 @@ def augment_images(input_dir, output_dir, target_count=200):
             print(f"Класс {class_name} уже имеет достаточно изображений")
             continue
             
-        # Копируем существующие изображения
-        for img_name in images:
-            src = os.path.join(class_path, img_name)
-            dst = os.path.join(output_class_path, img_name)
-            shutil.copy2(src, dst)
+        # Связываем существующие изображения с исходными (без копирования байтов)
+        methods = materialize_files(
+            (os.path.join(class_path, img_name), os.path.join(output_class_path, img_name)) for img_name in images
+        )
+        print(f"Исходные изображения: {describe(methods)}")
         
         # Вычисляем, сколько новых изображений нужно создать
         needed_count = target_count - current_count
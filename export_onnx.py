@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import numpy as np
+from chess_inference import CLASS_LABELS, IMG_SIZE, MODEL_FILE, InferenceEngine, preprocess_image
+from export_tflite import VAL_DIR, list_validation_images
+from onnx_backend import ONNXModel
+
+# Параметры экспорта
+ONNX_OPSET = 13
+THREAD_CANDIDATES = (1, 2, 4, 8)
+TUNING_RUNS = 20
+
+def onnx_path(model_file=MODEL_FILE):
+    return os.path.splitext(model_file)[0] + ".onnx"
+
+def export_onnx(model, output_path, opset=ONNX_OPSET):
+    """
+    Экспортирует Keras-модель в ONNX с динамическим размером пакета
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+    print(f"Модель ONNX сохранена: {output_path} ({os.path.getsize(output_path) / 1024 / 1024:.1f} МБ)")
+    return output_path
+
+def verify_onnx(model, path, val_dir=VAL_DIR):
+    """
+    Сравнивает предсказания Keras и ONNX Runtime на валидационной выборке.
+    Возвращает True, если top-1 совпадает для всех изображений.
+    """
+    items = list_validation_images(val_dir)
+    if not items:
+        print(f"В {val_dir} нет изображений для проверки")
+        return True
+    x = np.stack([preprocess_image(item_path) for item_path, _ in items])
+
+    keras_probs = InferenceEngine(model, CLASS_LABELS).predict_arrays(x)
+    onnx_probs = InferenceEngine(ONNXModel(path), CLASS_LABELS).predict_arrays(x)
+
+    mismatched = int(np.sum(keras_probs.argmax(axis=1) != onnx_probs.argmax(axis=1)))
+    max_diff = float(np.max(np.abs(keras_probs - onnx_probs)))
+    print(f"Проверка ONNX на {len(items)} изображениях: расхождений top-1 {mismatched}, "
+          f"макс. разница вероятностей {max_diff:.2e}")
+    return mismatched == 0
+
+def tune_threads(path, candidates=THREAD_CANDIDATES, runs=TUNING_RUNS):
+    """
+    Подбирает число потоков ONNX Runtime по задержке одиночного изображения
+    (основной сценарий GUI). Возвращает лучшее значение.
+    """
+    x = np.random.default_rng(0).random((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    max_threads = os.cpu_count() or 1
+    results = {}
+    for threads in candidates:
+        if threads > max_threads:
+            continue
+        model = ONNXModel(path, num_threads=threads)
+        model.predict_on_batch(x)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model.predict_on_batch(x)
+            timings.append((time.perf_counter() - start) * 1000)
+        results[threads] = float(np.median(timings))
+        print(f"Потоков: {threads:<3} медиана {results[threads]:.2f} мс")
+
+    best = min(results, key=results.get)
+    print(f"Рекомендуется CHESS_ONNX_THREADS={best}")
+    return best
+
+def main():
+    from chess_inference import load_classifier
+
+    model_file = sys.argv[1] if len(sys.argv) > 1 else MODEL_FILE
+    model = load_classifier(model_file, backend="keras")
+    path = export_onnx(model, onnx_path(model_file))
+    if not verify_onnx(model, path):
+        print("❌ Предсказания ONNX расходятся с Keras")
+        sys.exit(1)
+    tune_threads(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import csv
+import time
+import numpy as np
+from chess_inference import (BATCH_SIZE, CLASS_LABELS, MODEL_FILE, InferenceEngine,
+                             load_classifier, preprocess_image)
+from dataset_files import CLASSES
+from dataset_manifest import DATASET_MANIFEST, dataset_items
+from tflite_backend import TFLiteModel
+
+# Параметры экспорта
+# Проверочный набор: каталог классов или сплит "val" манифеста (CHESS_DATASET_MANIFEST)
+VAL_DIR = DATASET_MANIFEST or 'data/balanced_val'
+VARIANTS = ("float32", "float16", "int8")
+REPRESENTATIVE_SAMPLES = 200
+LATENCY_SAMPLES = 50
+REPORT_FILE = os.path.join('results', 'tflite_report.csv')
+
+def list_validation_images(val_dir=VAL_DIR):
+    """
+    Возвращает список (путь, индекс класса) в порядке классов модели;
+    для манифеста — строки сплита "val"
+    """
+    return dataset_items(val_dir, CLASSES, "val")
+
+def representative_dataset(val_dir=VAL_DIR, num_samples=REPRESENTATIVE_SAMPLES, seed=42):
+    """
+    Генератор калибровочных примеров для полной int8-квантизации
+    (та же предобработка, что и при инференсе)
+    """
+    items = list_validation_images(val_dir)
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(items), size=min(num_samples, len(items)), replace=False)
+
+    def generator():
+        for i in picked:
+            yield [preprocess_image(items[i][0])[np.newaxis]]
+    return generator
+
+def convert_model(model, variant, val_dir=VAL_DIR):
+    """
+    Конвертирует Keras-модель в TFLite: float32, float16 или полностью целочисленную int8
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(val_dir)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    elif variant != "float32":
+        raise ValueError(f"Неизвестный вариант TFLite: {variant}")
+    return converter.convert()
+
+def tflite_path(variant, model_file=MODEL_FILE):
+    return f"{os.path.splitext(model_file)[0]}_{variant}.tflite"
+
+def export_tflite(model, model_file=MODEL_FILE, variants=VARIANTS, val_dir=VAL_DIR):
+    """
+    Сохраняет все варианты TFLite рядом с исходной моделью
+    """
+    paths = {}
+    for variant in variants:
+        print(f"\nКонвертация в TFLite ({variant})...")
+        data = convert_model(model, variant, val_dir)
+        path = tflite_path(variant, model_file)
+        with open(path, 'wb') as f:
+            f.write(data)
+        print(f"Сохранено: {path} ({len(data) / 1024 / 1024:.1f} МБ)")
+        paths[variant] = path
+    return paths
+
+def evaluate_model(model, x, labels, reference=None):
+    """
+    Точность, совпадение top-1 с эталоном и задержка (мс на изображение)
+    в пакетном режиме и для одиночных изображений
+    """
+    engine = InferenceEngine(model, CLASS_LABELS, batch_size=BATCH_SIZE).warmup()
+
+    start = time.perf_counter()
+    probabilities = engine.predict_arrays(x)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(x)
+
+    single = []
+    for i in range(min(LATENCY_SAMPLES, len(x))):
+        start = time.perf_counter()
+        engine.predict_arrays(x[i:i + 1])
+        single.append((time.perf_counter() - start) * 1000)
+
+    top1 = probabilities.argmax(axis=1)
+    return {
+        "accuracy": float(np.mean(top1 == labels)),
+        "top1_agreement": float(np.mean(top1 == reference)) if reference is not None else 1.0,
+        "batch_ms": batch_ms,
+        "single_ms": float(np.median(single)),
+    }, top1
+
+def compare_variants(model, paths, model_file=MODEL_FILE, val_dir=VAL_DIR, report_file=REPORT_FILE):
+    """
+    Сравнивает Keras-модель и варианты TFLite на валидационной выборке
+    и сохраняет отчёт «точность — задержка»
+    """
+    items = list_validation_images(val_dir)
+    if not items:
+        print(f"В {val_dir} нет изображений для сравнения")
+        return []
+    # Изображения предобрабатываются один раз для всех вариантов
+    x = np.stack([preprocess_image(path) for path, _ in items])
+    labels = np.array([label for _, label in items])
+
+    rows = []
+    metrics, reference = evaluate_model(model, x, labels)
+    rows.append({"variant": "keras", "size_mb": os.path.getsize(model_file) / 1024 / 1024, **metrics})
+    for variant, path in paths.items():
+        metrics, _ = evaluate_model(TFLiteModel(path), x, labels, reference)
+        rows.append({"variant": variant, "size_mb": os.path.getsize(path) / 1024 / 1024, **metrics})
+
+    print(f"\nСравнение на {val_dir} ({len(items)} изображений):")
+    print(f"{'Вариант':<10}{'МБ':>8}{'Точность':>10}{'Совп. top-1':>13}{'мс/пакет':>10}{'мс/1 изобр.':>13}")
+    for row in rows:
+        print(f"{row['variant']:<10}{row['size_mb']:>8.1f}{row['accuracy']:>10.2%}"
+              f"{row['top1_agreement']:>13.2%}{row['batch_ms']:>10.2f}{row['single_ms']:>13.2f}")
+
+    os.makedirs(os.path.dirname(report_file) or '.', exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Отчёт сохранён в {report_file}")
+    return rows
+
+def main():
+    model = load_classifier(MODEL_FILE, backend="keras")
+    paths = export_tflite(model)
+    compare_variants(model, paths)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import errno
+import shutil
+from collections import Counter
+
+# Как раскладывать файлы по производным наборам: "auto" (reflink -> hardlink -> copy),
+# "reflink", "hardlink" или "copy". Копия делается, только если ссылку создать нельзя
+# (другая файловая система, ФС без reflink и т.п.)
+MATERIALIZE_MODE = os.environ.get("CHESS_MATERIALIZE", "auto")
+
+METHOD_ORDER = {
+    "auto": ("reflink", "hardlink", "copy"),
+    "reflink": ("reflink", "copy"),
+    "hardlink": ("hardlink", "copy"),
+    "copy": ("copy",),
+}
+
+# ioctl FICLONE (Linux: btrfs, XFS, bcachefs) — копия при записи без копирования данных
+FICLONE = 0x40049409
+
+# Ошибки, после которых способ не поддерживается для этой пары устройств
+_UNSUPPORTED_ERRORS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+                       errno.ENOTTY, errno.ENOSYS, errno.EACCES}
+# Запомненные неудачи: (способ, устройство источника, устройство каталога назначения)
+_unsupported = set()
+
+def _reflink(src, dst):
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "reflink поддерживается только в Linux")
+    import fcntl
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+def _copy(src, dst):
+    shutil.copy2(src, dst)
+
+METHODS = {"reflink": _reflink, "hardlink": _hardlink, "copy": _copy}
+
+def link_file(src, dst, mode=None):
+    """
+    Помещает src по пути dst без копирования байтов, если это возможно.
+    Возвращает использованный способ ("reflink", "hardlink", "copy" или "exists").
+    Жёсткая ссылка — тот же файл, поэтому производные наборы нельзя менять на месте:
+    все шаги конвейера пишут новые файлы, а не переписывают существующие
+    """
+    mode = mode or MATERIALIZE_MODE
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return "exists"
+        os.remove(dst)
+
+    devices = (os.stat(src).st_dev, os.stat(os.path.dirname(os.path.abspath(dst))).st_dev)
+    for method in METHOD_ORDER[mode]:
+        if (method, *devices) in _unsupported:
+            continue
+        try:
+            METHODS[method](src, dst)
+            return method
+        except OSError as e:
+            if method == "copy" or e.errno not in _UNSUPPORTED_ERRORS | {errno.EMLINK}:
+                raise
+            # EMLINK — предел ссылок у конкретного файла, а не у файловой системы
+            if e.errno != errno.EMLINK:
+                _unsupported.add((method, *devices))
+    raise OSError(errno.EOPNOTSUPP, f"Не удалось создать {dst} (режим {mode})")
+
+def materialize_files(pairs, mode=None):
+    """
+    Раскладывает пары (источник, назначение); возвращает Counter по способам
+    """
+    methods = Counter()
+    for src, dst in pairs:
+        methods[link_file(src, dst, mode)] += 1
+    return methods
+
+def describe(methods):
+    return ", ".join(f"{method}: {count}" for method, count in sorted(methods.items())) or "нет файлов"
@@ -1,9 +1,10 @@
 import os
-import shutil
 from PIL import Image
 import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
+from materialize import link_file
+from dataset_manifest import manifest_path, manifest_rows, write_manifest
 
 def normalize_class_names(input_dir, output_dir):
     """
@@ -38,8 +39,8 @@ def normalize_class_names(input_dir, output_dir):
             if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
                 src = os.path.join(old_path, filename)
                 dst = os.path.join(new_path, filename)
-                shutil.copy2(src, dst)
-                print(f"Скопирован файл: {src} -> {dst}")
+                method = link_file(src, dst)
+                print(f"Скопирован файл ({method}): {src} -> {dst}")
 
 def check_image_quality(directory):
     """
@@ -135,6 +136,7 @@ def main():
     # Нормализуем имена классов
     print("Нормализация имен классов...")
     normalize_class_names(raw_dir, normalized_dir)
+    write_manifest(manifest_rows(normalized_dir, "all", source="normalized"), manifest_path('normalized'))
     
     # Проверяем качество изображений
     print("\nПроверка качества изображений...")
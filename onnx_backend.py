@@ -0,0 +1,36 @@
+import os
+import numpy as np
+
+# Число потоков внутри операторов ONNX Runtime (подбирается export_onnx.py)
+ONNX_THREADS = int(os.environ.get("CHESS_ONNX_THREADS", os.cpu_count() or 4))
+
+def create_session(model_path, num_threads=ONNX_THREADS):
+    """
+    Сессия ONNX Runtime для CPU с заданным числом потоков
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = max(1, int(num_threads))
+    options.inter_op_num_threads = 1
+    # Потоки не крутятся в ожидании между вызовами — GUI большую часть времени простаивает
+    options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+class ONNXModel:
+    """
+    Модель ONNX Runtime с тем же интерфейсом predict_on_batch, что и у Keras-модели.
+    Не требует TensorFlow во время выполнения.
+    """
+
+    def __init__(self, model_path, num_threads=ONNX_THREADS):
+        self.model_path = model_path
+        self.session = create_session(model_path, num_threads)
+        self._input_name = self.session.get_inputs()[0].name
+        self._output_name = self.session.get_outputs()[0].name
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        return self.session.run([self._output_name], {self._input_name: x})[0]
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from chess_inference import DECODE_WORKERS, IMG_SIZE
+from dataset_manifest import dataset_classes, dataset_items, items_hash, is_manifest
+
+# Упакованные наборы: крупные шарды uint8 вместо десятков тысяч мелких файлов
+PACKED_DIR = os.path.join('data', 'packed')
+SHARD_SIZE = 4096
+# Сколько изображений читается подряд из шарда (внутри блока порядок перемешивается)
+READ_BLOCK = 1024
+# Примеры пишутся в шарды в перемешанном порядке: dataset_items отсортирован по классам,
+# а iter_batches перемешивает только шарды, блоки и примеры внутри блока
+PACK_SEED = 42
+
+def load_uint8(path):
+    """
+    Изображение 224x224 RGB uint8 с той же предобработкой, что и load_img (ресайз nearest)
+    """
+    with Image.open(path) as img:
+        img = img.convert('RGB')
+        if img.size != (IMG_SIZE, IMG_SIZE):
+            img = img.resize((IMG_SIZE, IMG_SIZE), Image.NEAREST)
+        return np.asarray(img, dtype=np.uint8)
+
+def packed_path(source_dir, packed_dir=PACKED_DIR, split=None):
+    name = os.path.basename(os.path.normpath(source_dir))
+    if is_manifest(source_dir):
+        # Сплиты одного манифеста упаковываются раздельно
+        name = os.path.splitext(name)[0]
+        if split:
+            name = f"{name}_{split}"
+    return os.path.join(packed_dir, name)
+
+def pack_dataset(source_dir, output_dir=None, classes=None, shard_size=SHARD_SIZE, split=None,
+                 seed=PACK_SEED):
+    """
+    Однократно упаковывает каталог классов (или сплит манифеста) в шарды
+    images_XXXXX.npy / labels_XXXXX.npy и index.json. Примеры перемешиваются
+    перестановкой с seed, чтобы блоки и шарды содержали все классы. Индекс пишется
+    последним, поэтому недописанный набор не используется.
+    """
+    if output_dir is None:
+        output_dir = packed_path(source_dir, split=split)
+    if classes is None:
+        classes = dataset_classes(source_dir, split)
+    items = dataset_items(source_dir, classes, split)
+    order = np.random.default_rng(seed).permutation(len(items))
+    os.makedirs(output_dir, exist_ok=True)
+
+    shards = []
+    with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+        for shard_idx, start in enumerate(range(0, len(items), shard_size)):
+            chunk = [items[i] for i in order[start:start + shard_size]]
+            images_name = f"images_{shard_idx:05d}.npy"
+            labels_name = f"labels_{shard_idx:05d}.npy"
+
+            # Шард заполняется через memmap, без сборки всего массива в памяти
+            tmp_images = os.path.join(output_dir, images_name + '.tmp')
+            images = np.lib.format.open_memmap(tmp_images, mode='w+', dtype=np.uint8,
+                                               shape=(len(chunk), IMG_SIZE, IMG_SIZE, 3))
+            for i, image in enumerate(pool.map(load_uint8, (path for path, _ in chunk))):
+                images[i] = image
+            images.flush()
+            del images
+            os.replace(tmp_images, os.path.join(output_dir, images_name))
+            np.save(os.path.join(output_dir, labels_name),
+                    np.array([label for _, label in chunk], dtype=np.int16))
+
+            shards.append({"images": images_name, "labels": labels_name, "count": len(chunk)})
+            print(f"Шард {shard_idx}: {start + len(chunk)}/{len(items)}")
+
+    index = {
+        "source": source_dir,
+        "split": split,
+        "items_hash": items_hash(items),
+        "seed": seed,
+        "classes": list(classes),
+        "img_size": IMG_SIZE,
+        "total": len(items),
+        "shards": shards,
+    }
+    with open(os.path.join(output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    print(f"Упаковано {len(items)} изображений в {len(shards)} шард(ов): {output_dir}")
+    return output_dir
+
+class PackedDataset:
+    """
+    Чтение упакованного набора: шарды открываются через memmap и читаются
+    последовательными блоками, без декодирования JPEG/PNG
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.classes = self.index["classes"]
+        self.shards = self.index["shards"]
+
+    def __len__(self):
+        return self.index["total"]
+
+    def _open(self, shard):
+        images = np.load(os.path.join(self.directory, shard["images"]), mmap_mode='r')
+        labels = np.load(os.path.join(self.directory, shard["labels"]))
+        return images, labels
+
+    def iter_batches(self, batch_size, shuffle=False, seed=None):
+        """
+        Пакеты (изображения uint8, метки). При shuffle перемешиваются порядок шардов,
+        порядок блоков и примеры внутри блока; сами блоки читаются последовательно.
+        """
+        rng = np.random.default_rng(seed)
+        shard_order = rng.permutation(len(self.shards)) if shuffle else range(len(self.shards))
+        # Остаток предыдущего блока (меньше пакета). Пакеты внутри блока — срезы
+        # без копирования; конкатенация нужна только для пакета на стыке блоков
+        carry_images, carry_labels = [], []
+        carried = 0
+
+        for shard_idx in shard_order:
+            images, labels = self._open(self.shards[shard_idx])
+            blocks = list(range(0, len(labels), READ_BLOCK))
+            if shuffle:
+                rng.shuffle(blocks)
+            for start in blocks:
+                block_images = np.asarray(images[start:start + READ_BLOCK])
+                block_labels = labels[start:start + READ_BLOCK]
+                if shuffle:
+                    order = rng.permutation(len(block_labels))
+                    block_images, block_labels = block_images[order], block_labels[order]
+
+                pos = 0
+                if carried:
+                    pos = min(batch_size - carried, len(block_labels))
+                    carry_images.append(block_images[:pos])
+                    carry_labels.append(block_labels[:pos])
+                    carried += pos
+                    if carried < batch_size:
+                        # Блок короче недостающей части пакета
+                        continue
+                    yield np.concatenate(carry_images), np.concatenate(carry_labels)
+                    carry_images, carry_labels = [], []
+                    carried = 0
+
+                while pos + batch_size <= len(block_labels):
+                    yield block_images[pos:pos + batch_size], block_labels[pos:pos + batch_size]
+                    pos += batch_size
+                if pos < len(block_labels):
+                    carry_images, carry_labels = [block_images[pos:]], [block_labels[pos:]]
+                    carried = len(block_labels) - pos
+
+        if carried:
+            yield np.concatenate(carry_images), np.concatenate(carry_labels)
+
+    def to_tf_dataset(self, batch_size, training=False, augmentation=None, seed=None):
+        """
+        tf.data.Dataset с one-hot метками (как class_mode='categorical'); каждая эпоха
+        заново перемешивает порядок чтения
+        """
+        import tensorflow as tf
+        from tf_data_loader import finish_batches
+
+        num_classes = len(self.classes)
+        epoch = [0]
+
+        def generator():
+            epoch_seed = None if seed is None else seed + epoch[0]
+            epoch[0] += 1
+            for x, y in self.iter_batches(batch_size, shuffle=training, seed=epoch_seed):
+                yield x, np.eye(num_classes, dtype=np.float32)[y]
+
+        ds = tf.data.Dataset.from_generator(
+            generator,
+            output_signature=(
+                tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.uint8),
+                tf.TensorSpec((None, num_classes), tf.float32),
+            )
+        )
+        return finish_batches(ds, augmentation)
+
+def load_packed(source_dir, classes=None, packed_dir=PACKED_DIR, split=None):
+    """
+    Открывает упакованную версию каталога или сплита манифеста, упаковывая его
+    при первом обращении и заново, если состав набора изменился
+    """
+    directory = packed_path(source_dir, packed_dir, split)
+    index_file = os.path.join(directory, 'index.json')
+    if classes is None:
+        classes = dataset_classes(source_dir, split)
+    current_hash = items_hash(dataset_items(source_dir, classes, split))
+    stale = True
+    if os.path.exists(index_file):
+        index = PackedDataset(directory).index
+        # Наборы, упакованные без перемешивания (нет "seed"), тоже пересобираются
+        stale = index.get("items_hash") != current_hash or index.get("seed") != PACK_SEED
+    if stale:
+        pack_dataset(source_dir, directory, classes, split=split)
+    dataset = PackedDataset(directory)
+    if list(classes) != dataset.classes:
+        raise ValueError(f"Порядок классов в {directory} ({dataset.classes}) не совпадает с {list(classes)}")
+    return dataset
+
+def main():
+    sources = sys.argv[1:] or ['data/balanced_train', 'data/balanced_val']
+    for source_dir in sources:
+        pack_dataset(source_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+import io
+import os
+import csv
+import time
+import atexit
+import sqlite3
+import threading
+
+# Лог предсказаний
+LOG_FILE = "predictions_log.csv"
+LOG_COLUMNS = ["Файл", "Класс", "Цвет", "Уверенность"]
+FLUSH_INTERVAL = 2.0  # секунды
+
+# Хранилище истории: "csv" (по умолчанию) или "sqlite"
+HISTORY_BACKEND = os.environ.get("CHESS_HISTORY_BACKEND", "csv")
+HISTORY_DB = "predictions_log.db"
+
+def _color_key(color):
+    return color.split(' ')[0] if color else ""
+
+def _matches(row, color=None, class_name=None):
+    # Те же правила, что и раньше в pandas: цвет по подстроке, класс по равенству
+    if color and color not in row[2]:
+        return False
+    if class_name and row[1] != class_name:
+        return False
+    return True
+
+class PredictionLogWriter:
+    """
+    Дописывает строки в CSV-лог за O(1): заголовок проверяется один раз при открытии,
+    дальше строки пишутся в открытый буферизованный файл и сбрасываются на диск
+    по интервалу, по flush() и при завершении процесса
+    """
+
+    def __init__(self, log_file=LOG_FILE, columns=LOG_COLUMNS, flush_interval=FLUSH_INTERVAL):
+        self.log_file = log_file
+        self.columns = list(columns)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer = None
+        # Смещения строк данных в файле: при чтении индексируется только дописанный хвост,
+        # а страница читается по смещениям, без хранения разобранной истории в памяти
+        self._offsets = []
+        self._index_pos = 0
+
+        self._ensure_header()
+        self._file = open(self.log_file, 'a', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        atexit.register(self.close)
+
+    def _ensure_header(self):
+        """
+        Создаёт лог с заголовком или откладывает в .bak файл с неверными колонками
+        """
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+            try:
+                with open(self.log_file, 'r', encoding='utf-8-sig', newline='') as f:
+                    headers = next(csv.reader(f))
+                if headers == self.columns:
+                    return
+            except Exception as e:
+                print(f"Ошибка чтения заголовка лога: {e}")
+            os.replace(self.log_file, self.log_file + '.bak')
+            print(f"Лог с неверными колонками сохранён как {self.log_file}.bak")
+
+        with open(self.log_file, 'w', encoding='utf-8-sig', newline='') as f:
+            csv.writer(f).writerow(self.columns)
+
+    def _to_row(self, entry):
+        if isinstance(entry, dict):
+            return [entry.get(col, "") for col in self.columns]
+        return list(entry)
+
+    def append(self, entry):
+        """
+        Добавляет одну запись (dict с колонками лога или последовательность значений)
+        """
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """
+        Добавляет пачку записей одним вызовом (для пакетной обработки)
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._writer.writerows(self._to_row(entry) for entry in entries)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+            elif self._timer is None:
+                # Отложенный сброс, чтобы последние строки не зависли в буфере
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_locked(self):
+        self._file.flush()
+        self._last_flush = time.monotonic()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self):
+        """
+        Сбрасывает буфер на диск (перед чтением лога)
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._flush_locked()
+                self._file.close()
+
+    def _parse_line(self, line):
+        """
+        Строка данных лога (кортеж) или None для заголовка и неполных строк
+        """
+        try:
+            text = line.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            # Старые логи в cp1251
+            text = line.decode('cp1251')
+        row = next(csv.reader([text]), [])
+        if len(row) < len(self.columns) or row[:len(self.columns)] == self.columns:
+            return None
+        return tuple(row[:len(self.columns)])
+
+    def _scan(self, start, stop=None):
+        """
+        Проходит по завершённым строкам файла начиная со смещения start;
+        выдаёт (смещение, строка данных) и в конце (позиция после последней строки, None)
+        """
+        pos = start
+        with open(self.log_file, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n') or (stop is not None and pos >= stop):
+                    break
+                row = self._parse_line(line)
+                if row is not None:
+                    yield pos, row
+                pos += len(line)
+        yield pos, None
+
+    def _update_index(self):
+        self.flush()
+        with self._lock:
+            if os.path.getsize(self.log_file) < self._index_pos:
+                # Файл был пересоздан — индексируем заново
+                self._offsets, self._index_pos = [], 0
+            for pos, row in self._scan(self._index_pos):
+                if row is None:
+                    self._index_pos = pos
+                else:
+                    self._offsets.append(pos)
+
+    def _matching_offsets(self, color=None, class_name=None):
+        """
+        Смещения строк, подходящих под фильтры. Без фильтров — сам индекс (не копия);
+        с фильтрами — один проход по файлу, в памяти остаются только смещения
+        """
+        self._update_index()
+        if not color and not class_name:
+            return self._offsets
+        return [pos for pos, row in self._scan(0, self._index_pos)
+                if row is not None and _matches(row, color, class_name)]
+
+    def _read_at(self, offsets):
+        rows = []
+        with open(self.log_file, 'rb') as f:
+            for pos in offsets:
+                f.seek(pos)
+                rows.append(self._parse_line(f.readline()))
+        return rows
+
+    def query(self, color=None, class_name=None, offset=0, limit=None, newest_first=False):
+        """
+        Возвращает строки истории (кортежи в порядке LOG_COLUMNS) с фильтрами.
+        Читаются только строки запрошенной страницы; фильтры требуют прохода
+        по файлу, поэтому для больших логов с фильтрами используйте SQLite.
+        """
+        offsets = self._matching_offsets(color, class_name)
+        total = len(offsets)
+        end = total if limit is None else min(total, offset + limit)
+        if offset >= end:
+            return []
+        if newest_first:
+            window = offsets[total - end:total - offset][::-1]
+        else:
+            window = offsets[offset:end]
+        return self._read_at(window)
+
+    def count(self, color=None, class_name=None):
+        return len(self._matching_offsets(color, class_name))
+
+    def to_dataframe(self, color=None, class_name=None):
+        """
+        История в виде pandas.DataFrame (для экспорта)
+        """
+        import pandas as pd
+        return pd.DataFrame(self.query(color, class_name), columns=self.columns)
+
+class SQLiteHistoryStore:
+    """
+    История предсказаний в SQLite (WAL, индексы по классу, цвету и времени).
+    Фильтры и постраничное чтение выполняются индексными запросами.
+    """
+
+    def __init__(self, db_file=HISTORY_DB, csv_file=LOG_FILE, columns=LOG_COLUMNS):
+        self.db_file = db_file
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        atexit.register(self.close)
+
+        # Первая миграция истории из CSV-лога
+        if csv_file and os.path.exists(csv_file) and self.count() == 0:
+            migrated = migrate_csv_to_sqlite(csv_file, self)
+            print(f"Перенесено записей из {csv_file}: {migrated}")
+
+    def _create_schema(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS predictions (
+                    id INTEGER PRIMARY KEY,
+                    file TEXT,
+                    class TEXT,
+                    color TEXT,
+                    color_key TEXT,
+                    confidence TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # Составные индексы с id: фильтр + сортировка по времени добавления без временной сортировки
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_class ON predictions(class, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_color ON predictions(color_key, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions(created_at)")
+
+    def _to_row(self, entry):
+        if isinstance(entry, dict):
+            row = tuple(entry.get(col, "") for col in self.columns)
+        else:
+            row = tuple(entry)
+        # Ключ цвета без эмодзи ("Чёрная ♟️" -> "Чёрная") для индексного фильтра
+        return row + (_color_key(row[2]),)
+
+    def append(self, entry):
+        self.append_many([entry])
+
+    def append_many(self, entries):
+        """
+        Добавляет пачку записей одной транзакцией
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO predictions (file, class, color, confidence, color_key) VALUES (?, ?, ?, ?, ?)",
+                (self._to_row(entry) for entry in entries)
+            )
+
+    def flush(self):
+        # Каждая пачка фиксируется своей транзакцией
+        pass
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _where(self, color=None, class_name=None):
+        clauses, params = [], []
+        if color:
+            clauses.append("color_key = ?")
+            params.append(_color_key(color))
+        if class_name:
+            clauses.append("class = ?")
+            params.append(class_name)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, color=None, class_name=None, offset=0, limit=None, newest_first=False):
+        """
+        Возвращает строки истории (кортежи в порядке LOG_COLUMNS) с фильтрами и пагинацией
+        """
+        where, params = self._where(color, class_name)
+        sql = "SELECT file, class, color, confidence FROM predictions" + where
+        sql += " ORDER BY id DESC" if newest_first else " ORDER BY id"
+        sql += " LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def count(self, color=None, class_name=None):
+        where, params = self._where(color, class_name)
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM predictions" + where, params).fetchone()[0]
+
+    def to_dataframe(self, color=None, class_name=None):
+        """
+        История в виде pandas.DataFrame (для экспорта)
+        """
+        import pandas as pd
+        return pd.DataFrame(self.query(color, class_name), columns=self.columns)
+
+def migrate_csv_to_sqlite(csv_file, store, chunk_size=10000):
+    """
+    Переносит историю из CSV-лога в SQLite-хранилище пачками
+    """
+    migrated = 0
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        chunk = []
+        for row in reader:
+            if len(row) < len(LOG_COLUMNS):
+                continue
+            chunk.append(row[:len(LOG_COLUMNS)])
+            if len(chunk) >= chunk_size:
+                store.append_many(chunk)
+                migrated += len(chunk)
+                chunk = []
+        if chunk:
+            store.append_many(chunk)
+            migrated += len(chunk)
+    return migrated
+
+def open_history_store(backend=HISTORY_BACKEND, log_file=LOG_FILE, db_file=HISTORY_DB):
+    """
+    Открывает хранилище истории выбранного типа (переменная окружения CHESS_HISTORY_BACKEND)
+    """
+    if backend == "sqlite":
+        return SQLiteHistoryStore(db_file, csv_file=log_file)
+    return PredictionLogWriter(log_file)
@@ -0,0 +1,70 @@
+import os
+import csv
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Журнал замеров холодного старта (одна строка на запуск)
+STARTUP_LOG = "startup_times.csv"
+
+# Этапы запуска в порядке отчёта
+STARTUP_STAGES = {
+    "imports": "импорты",
+    "window": "окно",
+    "model_load": "загрузка модели",
+    "first_predict": "первое предсказание",
+}
+
+class StartupTimer:
+    """
+    Замеры этапов запуска приложения (в секундах).
+    Этапы могут измеряться из разных потоков (фоновая загрузка модели).
+    """
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = seconds
+
+    def record_since_start(self, stage):
+        """
+        Фиксирует время от начала запуска до текущего момента
+        """
+        self.record(stage, time.perf_counter() - self.start)
+
+    @contextmanager
+    def measure(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def report(self):
+        with self._lock:
+            parts = [f"{label} {self.stages[stage]:.2f}"
+                     for stage, label in STARTUP_STAGES.items() if stage in self.stages]
+        return "Замеры запуска (с): " + " | ".join(parts)
+
+    def save(self, log_file=STARTUP_LOG):
+        """
+        Дописывает замеры в CSV, чтобы регрессии холодного старта были видны между запусками
+        """
+        try:
+            new_file = not os.path.exists(log_file) or os.path.getsize(log_file) == 0
+            with self._lock:
+                row = [datetime.now().isoformat(timespec='seconds')]
+                row += [f"{self.stages[stage]:.3f}" if stage in self.stages else ""
+                        for stage in STARTUP_STAGES]
+            with open(log_file, 'a', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["timestamp"] + list(STARTUP_STAGES))
+                writer.writerow(row)
+        except Exception as e:
+            print(f"Ошибка сохранения замеров запуска: {e}")
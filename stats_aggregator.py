@@ -0,0 +1,116 @@
+import os
+import json
+import atexit
+import tempfile
+import threading
+
+# Файл статистики классификаций
+STATS_FILE = "stats.json"
+SAVE_INTERVAL = 2.0  # секунды
+
+def empty_stats():
+    return {
+        "total_classifications": 0,
+        "by_class": {},
+        "by_color": {"Белая ♙": 0, "Чёрная ♟️": 0}
+    }
+
+class StatsAggregator:
+    """
+    Статистика классификаций в памяти: обновления стоят O(1),
+    на диск пишется не чаще раза в SAVE_INTERVAL (временный файл + rename)
+    и при завершении процесса
+    """
+
+    def __init__(self, stats_file=STATS_FILE, save_interval=SAVE_INTERVAL):
+        self.stats_file = stats_file
+        self.save_interval = save_interval
+        self.stats = empty_stats()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        self.load()
+        atexit.register(self.flush)
+
+    def load(self):
+        try:
+            if os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f)
+                with self._lock:
+                    # Обновляем словарь на месте, ссылки на self.stats остаются валидными
+                    self.stats.clear()
+                    self.stats.update(empty_stats())
+                    self.stats.update(loaded)
+        except Exception as e:
+            print(f"Ошибка загрузки статистики: {e}")
+
+    def _add(self, class_name, color):
+        self.stats['total_classifications'] += 1
+        self.stats['by_class'][class_name] = self.stats['by_class'].get(class_name, 0) + 1
+        if color in self.stats['by_color']:
+            self.stats['by_color'][color] += 1
+
+    def update(self, class_name, color):
+        self.update_many([(class_name, color)])
+
+    def update_many(self, entries):
+        """
+        Учитывает пачку пар (класс, цвет) и откладывает запись на диск
+        """
+        with self._lock:
+            for class_name, color in entries:
+                self._add(class_name, color)
+            self._schedule_save()
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.stats.update(empty_stats())
+            self._schedule_save()
+
+    def rebuild_from_history(self, rows):
+        """
+        Пересчитывает статистику по строкам истории (Файл, Класс, Цвет, Уверенность)
+        """
+        with self._lock:
+            self.stats.clear()
+            self.stats.update(empty_stats())
+            for _, class_name, color, _ in rows:
+                if class_name == "Ошибка":
+                    continue
+                self._add(class_name, color)
+            self._schedule_save()
+
+    def _schedule_save(self):
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """
+        Атомарно сохраняет статистику, если она менялась
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+
+            tmp_path = None
+            try:
+                directory = os.path.dirname(os.path.abspath(self.stats_file))
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.stats_', suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self.stats, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.stats_file)
+                # Флаг снимается только после успешной записи: при ошибке
+                # изменения сохранятся следующим flush()
+                self._dirty = False
+            except Exception as e:
+                print(f"Ошибка сохранения статистики: {e}")
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
@@ -0,0 +1,118 @@
+import sys
+import time
+from augmentation import AUGMENTATION_SEED, SeededAugmentation
+from dataset_files import CLASSES
+from dataset_manifest import dataset_classes, dataset_items
+
+# Параметры загрузчика
+IMG_SIZE = 224
+BATCH_SIZE = 32
+BENCHMARK_BATCHES = 50
+
+def make_augmentation(seed=AUGMENTATION_SEED, **params):
+    """
+    Воспроизводимая аугментация пакетов в памяти; params — как у ImageDataGenerator
+    (rotation_range, width_shift_range, shear_range, brightness_range, channel_shift_range, ...)
+    """
+    return SeededAugmentation(seed=seed, **params)
+
+def make_dataset(directory, classes=None, batch_size=BATCH_SIZE, training=False, augmentation=None,
+                 cache=False, seed=None, split=None):
+    """
+    tf.data-загрузчик вместо flow_from_directory (class_mode='categorical').
+    directory — каталог классов или манифест (.csv), из которого берётся сплит split.
+    Порядок классов и файлов совпадает с flow_from_directory; декодирование и ресайз
+    (nearest, как в load_img) выполняются параллельно, аугментация — на пакетах.
+    cache: False, True (в памяти) или путь к файлу кэша; кэшируются декодированные uint8.
+    """
+    import tensorflow as tf
+
+    if classes is None:
+        classes = dataset_classes(directory, split)
+    items = dataset_items(directory, classes, split)
+    num_classes = len(classes)
+    paths = [path for path, _ in items]
+    labels = tf.one_hot([label for _, label in items], num_classes)
+
+    def decode(path, label):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(image, (IMG_SIZE, IMG_SIZE), method='nearest')
+        image.set_shape((IMG_SIZE, IMG_SIZE, 3))
+        return image, label
+
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if training:
+        # Перемешиваются пути (дёшево), поэтому буфер покрывает весь набор
+        ds = ds.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+    # С заданным seed порядок примеров воспроизводим и при параллельном декодировании
+    ds = ds.map(decode, num_parallel_calls=tf.data.AUTOTUNE, deterministic=(not training) or seed is not None)
+    if cache:
+        ds = ds.cache(cache if isinstance(cache, str) else '')
+    return finish_batches(ds.batch(batch_size), augmentation)
+
+def finish_batches(ds, augmentation=None):
+    """
+    Общий хвост загрузчиков: аугментация пакетов uint8, нормализация 1/255 и prefetch
+    """
+    import tensorflow as tf
+
+    if augmentation is not None:
+        # Каждый пакет получает свой сид из воспроизводимого потока
+        ds = tf.data.Dataset.zip((ds, augmentation.seed_dataset()))
+        ds = ds.map(lambda batch, seed: (augmentation(batch[0], seed), batch[1]),
+                    num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.map(lambda x, y: (tf.cast(x, tf.float32) / 255.0, y), num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+def benchmark(batches, num_batches=BENCHMARK_BATCHES, warmup=2):
+    """
+    Пропускная способность загрузчика (изображений в секунду)
+    """
+    iterator = iter(batches)
+    for _ in range(warmup):
+        next(iterator)
+    images = 0
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        x, _ = next(iterator)
+        images += len(x)
+    return images / (time.perf_counter() - start)
+
+def main():
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'data/balanced_train'
+
+    # Текущий вариант: ImageDataGenerator с аугментацией, как в train_model.py
+    generator = ImageDataGenerator(
+        rescale=1./255,
+        rotation_range=20,
+        width_shift_range=0.2,
+        height_shift_range=0.2,
+        shear_range=0.2,
+        zoom_range=0.2,
+        horizontal_flip=True,
+        fill_mode='nearest'
+    ).flow_from_directory(
+        directory,
+        target_size=(IMG_SIZE, IMG_SIZE),
+        batch_size=BATCH_SIZE,
+        classes=CLASSES,
+        class_mode='categorical',
+        shuffle=True
+    )
+    dataset = make_dataset(directory, CLASSES, training=True, seed=AUGMENTATION_SEED, augmentation=make_augmentation(
+        rotation_range=20,
+        width_shift_range=0.2,
+        height_shift_range=0.2,
+        shear_range=0.2,
+        zoom_range=0.2,
+        horizontal_flip=True
+    ))
+
+    print(f"\nПропускная способность на {directory} ({BENCHMARK_BATCHES} пакетов по {BATCH_SIZE}):")
+    print(f"ImageDataGenerator: {benchmark(generator):.1f} изобр./с")
+    print(f"tf.data:            {benchmark(dataset):.1f} изобр./с")
+
+if __name__ == "__main__":
+    main()
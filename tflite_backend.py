@@ -0,0 +1,66 @@
+import os
+import threading
+import numpy as np
+
+# Число потоков интерпретатора TFLite
+TFLITE_THREADS = int(os.environ.get("CHESS_TFLITE_THREADS", os.cpu_count() or 4))
+
+def _interpreter_class():
+    # Лёгкий tflite_runtime, если установлен, иначе интерпретатор из TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+class TFLiteModel:
+    """
+    Модель TFLite с тем же интерфейсом predict_on_batch, что и у Keras-модели,
+    поэтому InferenceEngine работает с ней без изменений.
+    Квантованные (int8/uint8) входы и выходы пересчитываются автоматически.
+    """
+
+    def __init__(self, model_path, num_threads=TFLITE_THREADS):
+        self.model_path = model_path
+        Interpreter = _interpreter_class()
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._read_details()
+        # Интерпретатор не потокобезопасен (GUI вызывает модель и из рабочего потока)
+        self._lock = threading.Lock()
+
+    def _read_details(self):
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+
+    def _resize(self, batch_size):
+        # Тензоры переразмечаются только при смене размера пакета
+        if batch_size != self._batch_size:
+            shape = [batch_size] + list(self._input['shape'][1:])
+            self.interpreter.resize_tensor_input(self._input['index'], shape)
+            self.interpreter.allocate_tensors()
+            self._read_details()
+
+    def _quantize(self, x):
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return x.astype(np.float32, copy=False)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, y):
+        if self._output['dtype'] == np.float32:
+            return y
+        scale, zero_point = self._output['quantization']
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x)
+        with self._lock:
+            self._resize(len(x))
+            self.interpreter.set_tensor(self._input['index'], self._quantize(x))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output['index']).copy())
@@ -5,12 +5,39 @@ from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import ModelCheckpoint, EarlyStopping, ReduceLROnPlateau
 import matplotlib.pyplot as plt
+from dataset_manifest import DATASET_MANIFEST, flow_from_source
 
 # Параметры обучения
 IMG_SIZE = 224
 BATCH_SIZE = 32
 EPOCHS = 50
 NUM_CLASSES = 5
+# Загрузчик данных: "tf.data" (по умолчанию), "packed" (шарды data/packed) или "generator" (ImageDataGenerator)
+DATA_LOADER = os.environ.get("CHESS_DATA_LOADER", "tf.data")
+# Каталоги данных. Загрузчики tf.data/packed аугментируют на лету, поэтому обучаются
+# на сбалансированном наборе без материализованных копий и проверяются на его сплите val;
+# генератор — прежняя пара data/augmented и data/merged
+if DATA_LOADER in ("tf.data", "packed"):
+    DEFAULT_TRAIN_DIR, DEFAULT_VAL_DIR = 'data/balanced_train', 'data/balanced_val'
+else:
+    DEFAULT_TRAIN_DIR, DEFAULT_VAL_DIR = 'data/augmented', 'data/merged'
+TRAIN_DIR = os.environ.get("CHESS_TRAIN_DIR", DEFAULT_TRAIN_DIR)
+VAL_DIR = os.environ.get("CHESS_VAL_DIR", DEFAULT_VAL_DIR)
+# Манифест (CHESS_DATASET_MANIFEST) заменяет оба каталога: берутся его сплиты train и val
+if DATASET_MANIFEST:
+    TRAIN_DIR = VAL_DIR = DATASET_MANIFEST
+# Замороженная фаза на закэшированных эмбеддингах (CHESS_EMBEDDING_CACHE=1)
+USE_EMBEDDING_CACHE = os.environ.get("CHESS_EMBEDDING_CACHE") == "1"
+# Аугментация на лету в загрузчиках tf.data/packed (те же преобразования, что и у генератора)
+AUGMENTATION_SEED = 42
+AUGMENTATION_PARAMS = {
+    "rotation_range": 20,
+    "width_shift_range": 0.2,
+    "height_shift_range": 0.2,
+    "shear_range": 0.2,
+    "zoom_range": 0.2,
+    "horizontal_flip": True,
+}
 
 def create_model():
     """
@@ -53,16 +80,16 @@ def create_data_generators(train_dir, val_dir):
     
     val_datagen = ImageDataGenerator(rescale=1./255)
     
-    train_generator = train_datagen.flow_from_directory(
-        train_dir,
+    train_generator = flow_from_source(
+        train_datagen, train_dir, "train",
         target_size=(IMG_SIZE, IMG_SIZE),
         batch_size=BATCH_SIZE,
         class_mode='categorical',
         shuffle=True
     )
     
-    val_generator = val_datagen.flow_from_directory(
-        val_dir,
+    val_generator = flow_from_source(
+        val_datagen, val_dir, "val",
         target_size=(IMG_SIZE, IMG_SIZE),
         batch_size=BATCH_SIZE,
         class_mode='categorical',
@@ -71,6 +98,33 @@ def create_data_generators(train_dir, val_dir):
     
     return train_generator, val_generator
 
+def create_datasets(train_dir, val_dir):
+    """
+    Создает tf.data-загрузчики с той же аугментацией и порядком классов, что и генераторы
+    """
+    from tf_data_loader import make_augmentation, make_dataset
+
+    train_dataset = make_dataset(train_dir, batch_size=BATCH_SIZE, training=True, seed=AUGMENTATION_SEED,
+                                 augmentation=make_augmentation(AUGMENTATION_SEED, **AUGMENTATION_PARAMS),
+                                 split="train")
+    val_dataset = make_dataset(val_dir, batch_size=BATCH_SIZE, cache=True, split="val")
+    return train_dataset, val_dataset
+
+def create_packed_datasets(train_dir, val_dir):
+    """
+    Загрузчики из упакованных шардов uint8 (data/packed): без мелких файлов
+    и повторного декодирования; при первом запуске наборы упаковываются
+    """
+    from packed_dataset import load_packed
+    from tf_data_loader import make_augmentation
+
+    train_dataset = load_packed(train_dir, split="train").to_tf_dataset(
+        BATCH_SIZE, training=True, seed=AUGMENTATION_SEED,
+        augmentation=make_augmentation(AUGMENTATION_SEED, **AUGMENTATION_PARAMS)
+    )
+    val_dataset = load_packed(val_dir, split="val").to_tf_dataset(BATCH_SIZE)
+    return train_dataset, val_dataset
+
 def create_callbacks():
     """
     Создает callbacks для обучения
@@ -137,21 +191,38 @@ def main():
         metrics=['accuracy']
     )
     
-    # Создаем генераторы данных
-    train_generator, val_generator = create_data_generators('data/augmented', 'data/merged')
+    # Создаем загрузчики данных
+    if DATA_LOADER == "tf.data":
+        train_generator, val_generator = create_datasets(TRAIN_DIR, VAL_DIR)
+    elif DATA_LOADER == "packed":
+        train_generator, val_generator = create_packed_datasets(TRAIN_DIR, VAL_DIR)
+    else:
+        train_generator, val_generator = create_data_generators(TRAIN_DIR, VAL_DIR)
     
     # Создаем callbacks
     callbacks = create_callbacks()
     
     # Обучаем модель
     print("\nНачинаем обучение модели...")
-    history = model.fit(
-        train_generator,
-        validation_data=val_generator,
-        epochs=EPOCHS,
-        callbacks=callbacks,
-        verbose=1
-    )
+    if USE_EMBEDDING_CACHE:
+        # База заморожена: признаки считаются один раз и берутся из кэша,
+        # обучается только голова (чекпоинт сохранит фаза fine-tuning)
+        from embedding_cache import train_head_on_cache
+        history = train_head_on_cache(
+            model, TRAIN_DIR, VAL_DIR,
+            epochs=EPOCHS,
+            batch_size=BATCH_SIZE,
+            learning_rate=0.001,
+            callbacks=callbacks[1:]
+        )
+    else:
+        history = model.fit(
+            train_generator,
+            validation_data=val_generator,
+            epochs=EPOCHS,
+            callbacks=callbacks,
+            verbose=1
+        )
     
     # Строим графики обучения
     plot_training_history(history)
@@ -183,8 +254,17 @@ def main():
     
     # Сохраняем финальную модель
     model.save('final_model.h5')
+    
+    # Экспорт в ONNX для приложения без TensorFlow
+    try:
+        from export_onnx import export_onnx, verify_onnx
+        export_onnx(model, 'final_model.onnx')
+        verify_onnx(model, 'final_model.onnx')
+    except ImportError as e:
+        print(f"Экспорт в ONNX пропущен (нужны tf2onnx и onnxruntime): {e}")
+    
     print("\nОбучение завершено!")
-    print("Модели сохранены как 'best_model.h5' и 'final_model.h5'")
+    print("Модели сохранены как 'best_model.h5', 'final_model.h5' и 'final_model.onnx'")
     print("График обучения сохранен как 'training_history.png'")
 
 if __name__ == "__main__":